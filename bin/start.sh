@@ -42,6 +42,7 @@ DB_SCHEMA["summary"]="summary TEXT"
 DB_SCHEMA["is_summary_full"]="is_summary_full INTEGER DEFAULT 0"
 DB_SCHEMA["date_added"]="date_added TEXT"
 DB_SCHEMA["retry_count"]="retry_count INTEGER DEFAULT 0"
+DB_SCHEMA["metadata_hash"]="metadata_hash TEXT"
 
 if [ ! -f "$DB_FILE" ]; then
     echo "Database file not found. Creating a new one in $DATABASE_DIR..."
@@ -81,6 +82,50 @@ if ! sqlite3 "$DB_FILE" "PRAGMA table_info(jobs);" | cut -d'|' -f2 | grep -q "^j
     echo " -> Column 'job_params' added."
 fi
 
+# Key/value store for sync bookkeeping, such as the incremental sync watermark.
+if ! sqlite3 "$DB_FILE" ".table sync_state" | grep -q "sync_state"; then
+    echo "Creating 'sync_state' table..."
+    sqlite3 "$DB_FILE" "CREATE TABLE sync_state (key TEXT PRIMARY KEY, value TEXT);"
+    echo " -> 'sync_state' table created."
+fi
+
+# Records where each cover came from so sync can skip or conditionally revalidate it.
+if ! sqlite3 "$DB_FILE" ".table cover_manifest" | grep -q "cover_manifest"; then
+    echo "Creating 'cover_manifest' table..."
+    sqlite3 "$DB_FILE" "CREATE TABLE cover_manifest (asin TEXT PRIMARY KEY, source_url TEXT, etag TEXT, last_modified TEXT, size INTEGER, thumb_mtime REAL, checked_at REAL);"
+    echo " -> 'cover_manifest' table created."
+fi
+
+# Assigns each cover a fixed slot in the library grid's sprite sheets (the cover atlas).
+if ! sqlite3 "$DB_FILE" ".table cover_atlas" | grep -q "cover_atlas"; then
+    echo "Creating 'cover_atlas' table..."
+    sqlite3 "$DB_FILE" "CREATE TABLE cover_atlas (asin TEXT PRIMARY KEY, sheet INTEGER NOT NULL, slot INTEGER NOT NULL);"
+    echo " -> 'cover_atlas' table created."
+fi
+
+# Caches the probe results of every audiobook file found by a DEEP sync scan.
+if ! sqlite3 "$DB_FILE" ".table file_scan_cache" | grep -q "file_scan_cache"; then
+    echo "Creating 'file_scan_cache' table..."
+    sqlite3 "$DB_FILE" "CREATE TABLE file_scan_cache (filepath TEXT PRIMARY KEY, dirpath TEXT, size INTEGER, mtime_ns INTEGER, inode INTEGER, asin TEXT, duration REAL, bit_rate INTEGER, chapter_count INTEGER);"
+    # Lets a renamed or moved file be matched by its inode instead of being probed again.
+    sqlite3 "$DB_FILE" "CREATE INDEX idx_file_scan_cache_inode ON file_scan_cache (inode, size);"
+    echo " -> 'file_scan_cache' table created."
+fi
+if ! sqlite3 "$DB_FILE" "PRAGMA table_info(file_scan_cache);" | cut -d'|' -f2 | grep -q "^dirpath$"; then
+    echo "Schema mismatch. Adding missing column: 'dirpath' to 'file_scan_cache' table..."
+    sqlite3 "$DB_FILE" "ALTER TABLE file_scan_cache ADD COLUMN dirpath TEXT;"
+    echo " -> Column 'dirpath' added."
+fi
+# Lets the scan reuse the cached files of a directory that has not changed.
+sqlite3 "$DB_FILE" "CREATE INDEX IF NOT EXISTS idx_file_scan_cache_dirpath ON file_scan_cache (dirpath);"
+
+# Records each directory's mtime and subdirectories so unchanged directories are not listed again.
+if ! sqlite3 "$DB_FILE" ".table dir_scan_cache" | grep -q "dir_scan_cache"; then
+    echo "Creating 'dir_scan_cache' table..."
+    sqlite3 "$DB_FILE" "CREATE TABLE dir_scan_cache (dirpath TEXT PRIMARY KEY, mtime_ns INTEGER, subdirs TEXT);"
+    echo " -> 'dir_scan_cache' table created."
+fi
+
 # --- Mode Selection Logic ---
 echo "Checking for setup completion flag at $SETUP_FLAG_FILE..."
 # The core logic of the script: check if the setup flag file exists.
@@ -0,0 +1,175 @@
+# audible_downloader/audible_api.py
+
+import json
+import os
+import tomllib
+from threading import Lock
+
+import audible  # type: ignore
+import httpx  # type: ignore
+from audible.exceptions import AudibleError  # type: ignore
+
+from . import DATABASE_DIR
+from .logger import log
+
+# --- In-Process Audible API Client ---
+# This module replaces the `audible api ...` subprocess calls. The auth file is loaded
+# once and every request goes through a single pooled, keep-alive HTTP session, so a
+# call costs one round trip instead of an interpreter start plus a new TLS handshake.
+
+# audible-cli keeps its config.toml and the auth files it references here.
+AUDIBLE_CONFIG_DIR = os.path.join(DATABASE_DIR, ".audible")
+AUDIBLE_CONFIG_FILE = os.path.join(AUDIBLE_CONFIG_DIR, "config.toml")
+
+# Overrides the API base URL, e.g. to point the client at a local stand-in server.
+API_BASE_URL_ENV = "AUDIBLE_API_BASE_URL"
+
+# Connection pool limits for the shared session. Sync and the download pool can
+# issue several requests at once, so keep a few connections warm.
+MAX_CONNECTIONS = 10
+REQUEST_TIMEOUT_SEC = 30
+
+
+class AudibleApiError(Exception):
+    """Raised when a call to the Audible API fails."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AudibleApiTimeoutError(AudibleApiError):
+    """Raised when a call to the Audible API times out."""
+
+
+def _load_authenticator():
+    """
+    Loads the authenticator for the primary audible-cli profile.
+
+    Returns:
+        audible.Authenticator: The authenticator, which also signs and refreshes requests.
+
+    Raises:
+        OSError: If audible-cli has not been set up yet.
+    """
+    with open(AUDIBLE_CONFIG_FILE, "rb") as f:
+        config = tomllib.load(f)
+    profile_name = config.get("APP", {}).get("primary_profile")
+    profile = config.get("profile", {}).get(profile_name, {})
+    auth_file = profile.get("auth_file")
+    if not auth_file:
+        raise FileNotFoundError(f"No auth file configured for profile '{profile_name}' in {AUDIBLE_CONFIG_FILE}.")
+    auth_path = os.path.join(AUDIBLE_CONFIG_DIR, auth_file)
+    log.info(f"AUDIBLE_API: Loading auth file for profile '{profile_name}' from {auth_path}")
+    return audible.Authenticator.from_file(auth_path, locale=profile.get("country_code"))
+
+
+class AudibleApiClient:
+    """
+    A thread-safe client for the Audible API backed by one pooled HTTP session.
+
+    Args:
+        base_url (str): The API root. Defaults to the marketplace of the loaded auth file.
+        auth (httpx.Auth): Request authentication. Defaults to the primary audible-cli profile.
+    """
+
+    def __init__(self, base_url=None, auth=None):
+        self._base_url = base_url
+        self._auth = auth
+        self._http = None
+        self._lock = Lock()
+        self._last_access_token = None
+
+    def _get_session(self):
+        """Lazily loads the auth file and opens the pooled session on first use."""
+        with self._lock:
+            if self._http is None:
+                if self._auth is None:
+                    self._auth = _load_authenticator()
+                    self._last_access_token = self._auth.access_token
+                if self._base_url is None:
+                    self._base_url = f"https://api.audible.{self._auth.locale.domain}"
+                self._http = httpx.Client(
+                    base_url=self._base_url,
+                    auth=self._auth,
+                    timeout=REQUEST_TIMEOUT_SEC,
+                    limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+                )
+                log.info(f"AUDIBLE_API: Opened pooled session to {self._base_url}")
+            return self._http
+
+    def _persist_refreshed_token(self):
+        """Writes the auth file back if the authenticator refreshed its access token during a request."""
+        if not isinstance(self._auth, audible.Authenticator):
+            return
+        with self._lock:
+            if self._auth.access_token != self._last_access_token:
+                self._auth.to_file()
+                self._last_access_token = self._auth.access_token
+                log.info("AUDIBLE_API: Access token was refreshed and saved to the auth file.")
+
+    def get_response(self, path, **params):
+        """
+        Performs a GET request against the API.
+
+        Args:
+            path (str): The endpoint path, e.g. '/1.0/library'.
+            **params: Query string parameters.
+
+        Returns:
+            httpx.Response: The successful response, for callers that need headers.
+        """
+        try:
+            session = self._get_session()
+        except (OSError, ValueError, tomllib.TOMLDecodeError, AudibleError) as e:
+            raise AudibleApiError(f"Could not load the Audible auth file: {e}") from e
+        try:
+            response = session.get(path, params=params or None)
+            self._persist_refreshed_token()
+            response.raise_for_status()
+            return response
+        except httpx.TimeoutException as e:
+            raise AudibleApiTimeoutError(f"Request to {path} timed out.") from e
+        except httpx.HTTPStatusError as e:
+            message = f"Request to {path} failed with status {e.response.status_code}: {e.response.text[:500]}"
+            raise AudibleApiError(message, status_code=e.response.status_code) from e
+        except (httpx.HTTPError, AudibleError) as e:
+            raise AudibleApiError(f"Request to {path} failed: {e}") from e
+
+    def get(self, path, **params):
+        """Performs a GET request and returns the decoded JSON body."""
+        response = self.get_response(path, **params)
+        try:
+            return response.json()
+        except json.JSONDecodeError as e:
+            raise AudibleApiError(f"Invalid JSON in response from {path}: {e}") from e
+
+    def close(self):
+        """Closes the pooled session. It will be reopened on the next request."""
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+
+
+# --- Global Instance ---
+_api_client = None
+_api_client_lock = Lock()
+
+
+def get_api_client():
+    """Returns the shared API client, creating it on first use."""
+    global _api_client
+    with _api_client_lock:
+        if _api_client is None:
+            _api_client = AudibleApiClient(base_url=os.getenv(API_BASE_URL_ENV))
+        return _api_client
+
+
+def reset_api_client():
+    """Discards the shared client so the next call reloads the auth file, e.g. after re-authentication."""
+    global _api_client
+    with _api_client_lock:
+        if _api_client is not None:
+            _api_client.close()
+        _api_client = None
@@ -7,17 +7,23 @@
 # License: MIT (included in the project's LICENSE.txt file)
 # --- End Attribution ---
 
+import errno
 import json
+import math
 import os
 import re
+import shutil
 import subprocess
+import time
 from threading import Lock
 
 from . import (
     DATABASE_DIR,
     announcer,  # Import announcer for progress updates
 )
+from .audible_api import get_api_client
 from .logger import log
+from .mp4_reader import Mp4ParseError, read_audio_sample_table, read_mp4_info
 from .settings import load_settings
 
 # A lock to safely track progress across multiple threads, which will still be useful.
@@ -92,10 +98,11 @@ def prepare_book_assets(asin, job_id, temp_dir):
     # --- 2. Get Metadata & Decryption Keys ---
     _yield_progress(asin, "Preparing metadata...", 25, job_id)
     try:
-        endpoint, params = f"/1.0/library/{asin}", "response_groups=media,contributors,series,category_ladders"
-        meta_command = ["audible", "api", "-p", params, endpoint]
-        result = subprocess.run(meta_command, capture_output=True, text=True, check=True, encoding="utf-8", env=env)
-        book_info = json.loads(result.stdout).get("item")
+        book_info = (
+            get_api_client()
+            .get(f"/1.0/library/{asin}", response_groups="media,contributors,series,category_ladders")
+            .get("item")
+        )
 
         def _find_file_by_ext(directory, extensions):
             for entry in os.scandir(directory):
@@ -198,6 +205,200 @@ def prepare_book_assets(asin, job_id, temp_dir):
         return None
 
 
+# --- Chunk Planning ---
+# Chunks are planned from the chapter list instead of encoding one chunk per chapter:
+# short chapters are packed together and long ones are split, so every core gets about
+# the same amount of audio. The chapter markers still come from chapters.txt at merge time.
+DEFAULT_TARGET_CHUNK_MINUTES = 10
+# No chunk is planned shorter than this, so a short book is not split into slivers.
+MIN_CHUNK_SEC = 60
+# A cut within this fraction of a chunk's length from a chapter boundary is moved onto it.
+CHAPTER_SNAP_FRACTION = 0.25
+# How far the merged file's duration may drift from the source before the merge is failed.
+DURATION_TOLERANCE_SEC = 0.5
+DURATION_TOLERANCE_PER_CHUNK_SEC = 0.05
+
+
+def plan_chunks(chapters, total_cores, target_chunk_sec):
+    """
+    Plans the chunks a book is encoded in.
+
+    The chunk count is the book length over the target chunk length, rounded up to a
+    multiple of the core count so the cores finish together, and capped so no chunk is
+    shorter than MIN_CHUNK_SEC. Each ideal cut is then moved onto a nearby chapter
+    boundary if there is one, which packs short chapters into one chunk, and otherwise
+    stays in the middle of the chapter, which splits long chapters.
+
+    Args:
+        chapters (list): The chapter list from prepare_book_assets.
+        total_cores (int): How many chunks can be encoded at the same time.
+        target_chunk_sec (float): The preferred chunk length in seconds.
+
+    Returns:
+        list: chunk_info dicts with 'index', 'total_chunks', 'start' and 'duration' in seconds.
+    """
+    boundaries_ms = sorted(
+        {c.get("start_offset_ms", 0) for c in chapters}
+        | {c.get("start_offset_ms", 0) + c.get("length_ms", 0) for c in chapters}
+    )
+    book_start_ms, book_end_ms = boundaries_ms[0], boundaries_ms[-1]
+    total_ms = book_end_ms - book_start_ms
+
+    chunk_count = 1
+    if total_ms > 0:
+        total_cores = max(1, total_cores)
+        by_target = math.ceil(total_ms / 1000 / max(target_chunk_sec, MIN_CHUNK_SEC))
+        chunk_count = math.ceil(by_target / total_cores) * total_cores
+        chunk_count = max(1, min(chunk_count, int(total_ms / 1000 // MIN_CHUNK_SEC)))
+
+    chunk_ms = total_ms / chunk_count
+    cuts = [book_start_ms]
+    for k in range(1, chunk_count):
+        ideal = book_start_ms + k * chunk_ms
+        nearest = min(boundaries_ms, key=lambda boundary: abs(boundary - ideal))
+        cut = nearest if abs(nearest - ideal) <= chunk_ms * CHAPTER_SNAP_FRACTION else round(ideal)
+        if cut > cuts[-1]:
+            cuts.append(cut)
+    cuts.append(book_end_ms)
+
+    return [
+        {
+            "index": i,
+            "total_chunks": len(cuts) - 1,
+            "start": start / 1000.0,
+            "duration": (end - start) / 1000.0,
+        }
+        for i, (start, end) in enumerate(zip(cuts, cuts[1:], strict=False))
+    ]
+
+
+def _align_ticks(targets, runs):
+    """
+    Moves sorted tick positions onto the nearest frame boundary of an stts run list.
+
+    Returns:
+        tuple: (aligned positions, total ticks of the track).
+    """
+    aligned = []
+    run_iter = iter(runs)
+    base, count, delta = 0, 0, 1
+    for target in targets:
+        # Advance to the run that contains the target; a target past the end lands on the last frame.
+        while target >= base + count * delta:
+            next_run = next(run_iter, None)
+            if next_run is None:
+                break
+            base += count * delta
+            count, delta = next_run
+        frames = min(max(round((target - base) / delta), 0), count) if delta else 0
+        aligned.append(base + frames * delta)
+    total_ticks = sum(count * delta for count, delta in runs)
+    return [min(position, total_ticks) for position in aligned], total_ticks
+
+
+def align_chunks_to_frames(asin, chunks, context):
+    """
+    Moves the planned chunk boundaries onto AAC frame boundaries taken from the source's
+    sample table, so each encoder gets an exact range of whole frames: the input seek
+    lands on a packet without decoding and discarding audio before it, and the chunks
+    join without overlaps or gaps. The last chunk runs to the end of the audio track.
+    The track's exact duration is stored as context['source_duration'] for the merge check.
+
+    Args:
+        asin (str): The ASIN of the book.
+        chunks (list): chunk_info dicts from plan_chunks().
+        context (dict): The context dictionary from the prepare_book_assets step.
+
+    Returns:
+        list: The aligned chunk_info dicts, or the planned ones if the sample table cannot be read.
+    """
+    try:
+        sample_table = read_audio_sample_table(context["audio_file"])
+    except (Mp4ParseError, OSError) as e:
+        log.warning(f"PREPARE ({asin}): Could not read the sample table, keeping millisecond chunk cuts: {e}")
+        return chunks
+
+    timescale = sample_table["timescale"]
+    targets = [round(chunk["start"] * timescale) for chunk in chunks]
+    cuts, total_ticks = _align_ticks(targets, sample_table["stts"])
+    cuts = sorted(set(cuts)) + [total_ticks]
+    context["source_duration"] = total_ticks / timescale
+
+    aligned = [(start, end) for start, end in zip(cuts, cuts[1:], strict=False) if end > start]
+    return [
+        {
+            "index": i,
+            "total_chunks": len(aligned),
+            "start": start / timescale,
+            "duration": (end - start) / timescale,
+        }
+        for i, (start, end) in enumerate(aligned)
+    ]
+
+
+# The decrypted copy of the source is only made for books with at least this many chunks;
+# with fewer, the extra pass over the file costs more than the per-chunk setups it saves.
+DECRYPT_ONCE_MIN_CHUNKS = 4
+
+
+def decrypt_source_once(asin, job_id, temp_dir, context, chunk_count):
+    """
+    Optional stage between preparation and encoding: decrypts the AAX/AAXC source once,
+    with a lossless stream copy, into a plain local MP4. Every chunk encoder then opens
+    and seeks in that file instead of setting up decryption and seeking in the
+    encrypted source itself. The time the decryption took is logged.
+
+    Args:
+        asin (str): The ASIN of the book.
+        job_id (int): The parent job ID for logging.
+        temp_dir (str): The path to the temporary directory for this book.
+        context (dict): The context dictionary from the prepare_book_assets step. On success its
+            'audio_file' points to the decrypted copy and its 'decryption_args' are cleared.
+        chunk_count (int): How many chunks will be encoded from the source.
+
+    Returns:
+        bool: True if the chunks will read the decrypted copy, False if they keep reading the source.
+    """
+    if chunk_count < DECRYPT_ONCE_MIN_CHUNKS:
+        log.info(f"DECRYPT ({asin}): Only {chunk_count} chunk(s), reading the encrypted source directly.")
+        return False
+
+    _yield_progress(asin, "Decrypting...", 27, job_id)
+    source_file, decryption_args = context["audio_file"], context["decryption_args"]
+    decrypted_file = os.path.join(temp_dir, "decrypted.mp4")
+    decrypt_command = (
+        ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"]
+        + decryption_args
+        + ["-i", source_file, "-map", "0:a", "-c", "copy", "-map_metadata", "-1", decrypted_file]
+    )
+    try:
+        started = time.monotonic()
+        subprocess.run(decrypt_command, check=True, capture_output=True, text=True)
+        decrypt_sec = time.monotonic() - started
+    except subprocess.CalledProcessError as e:
+        log.warning(f"DECRYPT ({asin}): Decrypting once failed, reading the encrypted source instead: {e.stderr}")
+        if os.path.exists(decrypted_file):
+            os.remove(decrypted_file)
+        return False
+
+    context["audio_file"] = decrypted_file
+    context["decryption_args"] = []
+    # The chunks only read the decrypted copy, so the encrypted one no longer needs temp space.
+    os.remove(source_file)
+    log.info(f"DECRYPT ({asin}): Decrypted the source once in {decrypt_sec:.1f}s for {chunk_count} chunks.")
+    return True
+
+
+def _audio_flags(settings):
+    """Returns the ffmpeg AAC encoder flags for the configured conversion quality."""
+    quality = settings.get("conversion", {}).get("quality", "High")
+    return {
+        "High": ["-c:a", "aac", "-b:a", "128k"],
+        "Standard": ["-c:a", "aac", "-b:a", "96k"],
+        "Low": ["-c:a", "aac", "-b:a", "64k"],
+    }.get(quality, ["-c:a", "aac", "-b:a", "128k"])
+
+
 def encode_chapter_chunk(asin, job_id, temp_dir, chunk_info, context):
     """
     Handles Phase 2 of conversion: encoding a single chapter of the book.
@@ -217,13 +418,7 @@ def encode_chapter_chunk(asin, job_id, temp_dir, chunk_info, context):
     total_chunks = chunk_info["total_chunks"]
     log.info(f"ENCODE ({asin}): Starting encoding for chunk {chunk_index + 1}/{total_chunks}")
 
-    settings = load_settings()
-    quality = settings.get("conversion", {}).get("quality", "High")
-    audio_flags = {
-        "High": ["-c:a", "aac", "-b:a", "128k"],
-        "Standard": ["-c:a", "aac", "-b:a", "96k"],
-        "Low": ["-c:a", "aac", "-b:a", "64k"],
-    }.get(quality, ["-c:a", "aac", "-b:a", "128k"])
+    audio_flags = _audio_flags(load_settings())
 
     output_path = os.path.join(temp_dir, f"chunk_{chunk_index:03d}.m4b")
     split_command = (
@@ -243,6 +438,202 @@ def encode_chapter_chunk(asin, job_id, temp_dir, chunk_info, context):
         return None
 
 
+def _build_final_mux_command(audio_input_args, context, final_output_path, audio_codec_args=None):
+    """
+    Builds the ffmpeg command that writes the final .m4b: the audio of the first input,
+    plus the cover art, metadata and chapters from prepare_book_assets. Everything is
+    stream-copied unless audio_codec_args are given, which then encode the audio.
+    """
+    codec_args = ["-c", "copy"]  # Use fast, lossless copy since the audio is already AAC
+    if audio_codec_args:
+        codec_args = ["-c:v", "copy"] + audio_codec_args
+    return (
+        ["ffmpeg", "-y"]
+        + audio_input_args
+        + ["-i", context["cover_file"], "-i", context["chapter_file"]]
+        + ["-map", "0:a", "-map", "1:v", "-map_metadata", "2", "-map_chapters", "2"]
+        + codec_args
+        + ["-id3v2_version", "3", "-disposition:v", "attached_pic"]
+        + ["-movflags", "+faststart+use_metadata_tags"]
+        + ["-metadata:s:v", 'title="Album cover"', "-metadata:s:v", 'comment="Cover (front)"', final_output_path]
+    )
+
+
+def remux_book(asin, job_id, temp_dir, final_output_path, context):
+    """
+    Handles the "Original" quality mode: decrypts the source and remuxes its AAC audio
+    into the final .m4b without re-encoding, replacing the encode and merge phases.
+    Like the encoders, it writes to the temp dir and only moves the checked file into the library.
+
+    Args:
+        asin (str): The ASIN of the book.
+        job_id (int): The parent job ID for logging.
+        temp_dir (str): The path to the temporary directory for this book.
+        final_output_path (str): The absolute path for the final audiobook file.
+        context (dict): The context dictionary from the prepare_book_assets step.
+
+    Returns:
+        bool: True on success, False on failure.
+    """
+    log.info(f"REMUX ({asin}): Remuxing the original audio without re-encoding...")
+    _yield_progress(asin, "Remuxing original audio...", 50, job_id)
+    if not context.get("source_duration"):
+        context["source_duration"] = _read_source_duration(asin, "REMUX", context)
+    temp_output_path = os.path.join(temp_dir, TEMP_OUTPUT_FILENAME)
+    remux_command = _build_final_mux_command(
+        context["decryption_args"] + ["-i", context["audio_file"]], context, temp_output_path
+    )
+    try:
+        subprocess.run(remux_command, cwd=temp_dir, check=True, capture_output=True, text=True, encoding="utf-8")
+    except subprocess.CalledProcessError as e:
+        log.error(f"REMUX ({asin}): Remux failed. Stderr:\n{e.stderr}")
+        return False
+    if not _output_duration_matches(asin, "REMUX", temp_output_path, context, 1):
+        return False
+    if not _move_into_library(asin, "REMUX", temp_output_path, final_output_path):
+        return False
+    log.info(f"REMUX ({asin}): Successfully wrote {final_output_path}")
+    return True
+
+
+# The final file is written inside the book's temp dir and only moved into the library once
+# it has passed its checks, so the library watcher and DEEP sync never see a damaged file.
+TEMP_OUTPUT_FILENAME = "output.m4b"
+
+
+def _move_into_library(asin, phase, temp_output_path, final_output_path):
+    """
+    Moves a checked output file from the temp dir to its library path. When the temp dir is
+    on another filesystem, the file is copied next to its destination under a hidden name
+    first, so the library only ever shows the complete file. phase is the calling step's log prefix.
+
+    Returns:
+        bool: True on success, False on failure.
+    """
+    try:
+        try:
+            os.replace(temp_output_path, final_output_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            directory, filename = os.path.split(final_output_path)
+            partial_path = os.path.join(directory, f".{filename}.part")
+            shutil.copyfile(temp_output_path, partial_path)
+            os.replace(partial_path, final_output_path)
+        return True
+    except OSError as e:
+        log.error(f"{phase} ({asin}): Could not move the finished file to {final_output_path}: {e}")
+        return False
+
+
+# A single-process encode runs one multi-threaded ffmpeg for the whole book. ffmpeg's
+# native AAC encoder gains little past a few threads, so the task reserves at most this many cores.
+SINGLE_PASS_MAX_THREADS = 4
+
+
+def _read_source_duration(asin, phase, context):
+    """Returns the exact duration of the source audio track in seconds, or None if it cannot be read."""
+    try:
+        sample_table = read_audio_sample_table(context["audio_file"])
+    except (Mp4ParseError, OSError) as e:
+        log.warning(f"{phase} ({asin}): Could not read the source duration: {e}")
+        return None
+    total_ticks = sum(count * delta for count, delta in sample_table["stts"])
+    return total_ticks / sample_table["timescale"]
+
+
+def encode_book_single_pass(asin, job_id, temp_dir, final_output_path, context, threads):
+    """
+    Handles the single-process encode strategy: one multi-threaded ffmpeg encodes the whole
+    book straight into the final .m4b with its cover art, metadata and chapters, replacing
+    the chunk encode and merge phases.
+
+    Args:
+        asin (str): The ASIN of the book.
+        job_id (int): The parent job ID for logging.
+        temp_dir (str): The path to the temporary directory for this book.
+        final_output_path (str): The absolute path for the final audiobook file.
+        context (dict): The context dictionary from the prepare_book_assets step.
+        threads (int): How many threads ffmpeg may use.
+
+    Returns:
+        bool: True on success, False on failure.
+    """
+    log.info(f"ENCODE ({asin}): Encoding the whole book in a single ffmpeg process with {threads} thread(s)...")
+    if not context.get("source_duration"):
+        context["source_duration"] = _read_source_duration(asin, "ENCODE", context)
+    source_duration = context["source_duration"]
+
+    temp_output_path = os.path.join(temp_dir, TEMP_OUTPUT_FILENAME)
+    encode_command = _build_final_mux_command(
+        context["decryption_args"] + ["-i", context["audio_file"]],
+        context,
+        temp_output_path,
+        audio_codec_args=_audio_flags(load_settings()) + ["-threads", str(threads)],
+    )
+    # Report the encoder's position on stdout, so the book's progress moves while it runs.
+    encode_command[1:1] = ["-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1"]
+
+    # stderr goes to a file: a pipe nobody reads while stdout is followed could fill up and stall ffmpeg.
+    stderr_path = os.path.join(temp_dir, "encode_stderr.log")
+    with open(stderr_path, "w", encoding="utf-8") as stderr_file:
+        process = subprocess.Popen(
+            encode_command, cwd=temp_dir, stdout=subprocess.PIPE, stderr=stderr_file, text=True, encoding="utf-8"
+        )
+        last_progress = 30
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if key != "out_time_us" or not source_duration or not value.isdigit():
+                continue
+            progress = 30 + int(min(int(value) / 1_000_000 / source_duration, 1) * 65)
+            if progress > last_progress:
+                last_progress = progress
+                _yield_progress(asin, "Encoding...", progress, job_id)
+        process.wait()
+
+    if process.returncode != 0:
+        with open(stderr_path, encoding="utf-8", errors="replace") as f:
+            stderr = f.read()
+        log.error(f"ENCODE ({asin}): Single-process encode failed. Stderr:\n{stderr}")
+        return False
+    if not _output_duration_matches(asin, "ENCODE", temp_output_path, context, 1):
+        return False
+    if not _move_into_library(asin, "ENCODE", temp_output_path, final_output_path):
+        return False
+    log.info(f"ENCODE ({asin}): Successfully encoded and finalized file at {final_output_path}")
+    return True
+
+
+def _output_duration_matches(asin, phase, final_output_path, context, chunk_count):
+    """
+    Checks the output file's duration against the source audio track, so a lost, doubled
+    or misaligned chunk fails the book instead of producing a damaged file.
+    Skipped when the source duration is unknown (see align_chunks_to_frames).
+    phase is the calling step's log prefix.
+    """
+    source_duration = context.get("source_duration")
+    if not source_duration:
+        return True
+    try:
+        output_duration = read_mp4_info(final_output_path)["duration"]
+    except (Mp4ParseError, OSError) as e:
+        log.warning(f"{phase} ({asin}): Could not read the output file's duration, skipping the check: {e}")
+        return True
+    if output_duration is None:
+        return True
+    # Each encoded chunk may differ from its range by a few frames of encoder padding.
+    tolerance = DURATION_TOLERANCE_SEC + chunk_count * DURATION_TOLERANCE_PER_CHUNK_SEC
+    difference = output_duration - source_duration
+    if abs(difference) > tolerance:
+        log.error(
+            f"{phase} ({asin}): Output duration {output_duration:.3f}s differs from the source "
+            f"{source_duration:.3f}s by {difference:+.3f}s (allowed: {tolerance:.3f}s)."
+        )
+        return False
+    log.info(f"{phase} ({asin}): Output duration matches the source within {difference:+.3f}s.")
+    return True
+
+
 def merge_book_chunks(asin, job_id, temp_dir, final_output_path, context, encoded_chunk_paths):
     """
     Handles Phase 3 of conversion: merging all encoded chapter chunks into
@@ -270,14 +661,9 @@ def merge_book_chunks(asin, job_id, temp_dir, final_output_path, context, encode
             # Format for ffmpeg, quoting is not needed here
             f.write(f"file '{os.path.basename(chunk_path)}'\n")
 
-    merge_command = (
-        ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", merge_list_path]
-        + ["-i", context["cover_file"], "-i", context["chapter_file"]]
-        + ["-map", "0:a", "-map", "1:v", "-map_metadata", "2", "-map_chapters", "2"]
-        + ["-c", "copy"]  # Use fast, lossless copy since chunks are already encoded
-        + ["-id3v2_version", "3", "-disposition:v", "attached_pic"]
-        + ["-movflags", "+faststart+use_metadata_tags"]
-        + ["-metadata:s:v", 'title="Album cover"', "-metadata:s:v", 'comment="Cover (front)"', final_output_path]
+    temp_output_path = os.path.join(temp_dir, TEMP_OUTPUT_FILENAME)
+    merge_command = _build_final_mux_command(
+        ["-f", "concat", "-safe", "0", "-i", merge_list_path], context, temp_output_path
     )
 
     try:
@@ -290,6 +676,10 @@ def merge_book_chunks(asin, job_id, temp_dir, final_output_path, context, encode
         if process.returncode != 0:
             raise subprocess.CalledProcessError(process.returncode, merge_command, stderr=stderr)
 
+        if not _output_duration_matches(asin, "MERGE", temp_output_path, context, len(encoded_chunk_paths)):
+            return False
+        if not _move_into_library(asin, "MERGE", temp_output_path, final_output_path):
+            return False
         log.info(f"MERGE ({asin}): Successfully merged and finalized file at {final_output_path}")
         return True
     except subprocess.CalledProcessError as e:
@@ -0,0 +1,572 @@
+# audible_downloader/cover_logic.py
+
+import hashlib
+import math
+import os
+import subprocess
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import requests  # type: ignore
+from requests.adapters import HTTPAdapter  # type: ignore
+
+from . import COVERS_DIR
+from .db import get_db_connection
+from .logger import log
+
+# --- Cover Art Pipeline ---
+# Covers are handled in their own stage instead of inline in the sync loop. Downloads
+# run concurrently over one keep-alive session, and thumbnails are made by a single
+# ffmpeg call per batch instead of one ffmpeg process per cover.
+
+# How many covers are downloaded at the same time.
+COVER_DOWNLOAD_WORKERS = 8
+# How many downloaded covers are scaled by a single ffmpeg invocation.
+THUMBNAIL_BATCH_SIZE = 25
+THUMBNAIL_SIZE = "200:200"
+# Known covers are revalidated with a conditional GET once their last check is older than this.
+COVER_REVALIDATE_AFTER = 7 * 24 * 3600
+
+# The cover_manifest columns besides the asin primary key.
+MANIFEST_COLUMNS = ("source_url", "etag", "last_modified", "size", "thumb_mtime", "checked_at")
+
+# --- On-Demand Cover Variants ---
+# The UI asks for covers at the size it displays them, e.g. /covers/<asin>?w=120&fmt=webp.
+# Variants are scaled from the original on first request and kept in a disk cache that
+# is trimmed least-recently-used first once it grows past COVER_VARIANT_CACHE_MAX_BYTES.
+COVER_VARIANTS_DIR = os.path.join(COVERS_DIR, "variants")
+# Requested widths are rounded up to one of these, so the cache holds a few sizes per cover, not one per pixel.
+COVER_VARIANT_WIDTHS = (80, 120, 200, 300, 500)
+COVER_VARIANT_FORMATS = {"jpg": "image/jpeg", "webp": "image/webp"}
+COVER_VARIANT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Eviction trims the cache down to this share of the limit, so it does not run on every new variant.
+COVER_VARIANT_CACHE_LOW_WATER = 0.9
+# A cache hit refreshes the variant's mtime (its LRU timestamp) at most this often.
+COVER_VARIANT_TOUCH_INTERVAL = 3600
+
+_variant_cache_lock = Lock()
+_variant_cache_bytes = None
+
+# --- Cover Atlas ---
+# The library grid loads its covers from a few sprite sheets instead of one request per book.
+# Every cover gets a fixed sheet/slot the first time it is seen, so a new or changed cover
+# only invalidates the one sheet it lives on.
+COVER_ATLAS_DIR = os.path.join(COVERS_DIR, "atlas")
+ATLAS_TILE_SIZE = 200
+ATLAS_COLUMNS = 10
+ATLAS_SHEET_SIZE = 100
+# Empty slots (e.g. books that were removed) are filled with this color.
+ATLAS_PLACEHOLDER_COLOR = "0x2a2a2a"
+
+_atlas_lock = Lock()
+_atlas_sheet_locks = {}
+
+
+def cover_paths(asin, covers_dir=COVERS_DIR):
+    """Returns the (original, thumbnail) file paths for a book's cover."""
+    return (
+        os.path.join(covers_dir, f"{asin}_original.jpg"),
+        os.path.join(covers_dir, f"{asin}_thumb.jpg"),
+    )
+
+
+def make_thumbnails(asins, covers_dir=COVERS_DIR):
+    """
+    Scales the original covers of several books to thumbnails with one ffmpeg process.
+    If the batch fails (e.g. one corrupt image), each cover is retried on its own.
+
+    Returns:
+        list: The ASINs whose thumbnail could not be created.
+    """
+    if not asins:
+        return []
+    command = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"]
+    for asin in asins:
+        command += ["-i", cover_paths(asin, covers_dir)[0]]
+    for index, asin in enumerate(asins):
+        command += ["-map", f"{index}:v", "-vf", f"scale={THUMBNAIL_SIZE}", cover_paths(asin, covers_dir)[1]]
+    try:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        return []
+    except subprocess.CalledProcessError:
+        if len(asins) == 1:
+            return list(asins)
+    failed = []
+    for asin in asins:
+        failed += make_thumbnails([asin], covers_dir)
+    return failed
+
+
+def _cover_variant_source(asin, covers_dir=COVERS_DIR):
+    """Returns the best existing source image for a cover's variants, or None."""
+    for path in cover_paths(asin, covers_dir):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _snap_variant_width(width):
+    """Rounds a requested width up to the nearest cached size."""
+    for allowed in COVER_VARIANT_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return COVER_VARIANT_WIDTHS[-1]
+
+
+def _evict_cover_variants(variants_dir):
+    """
+    Deletes the least recently used variants until the cache is below its low-water mark.
+    The caller must hold _variant_cache_lock.
+    """
+    global _variant_cache_bytes
+    entries = []
+    with os.scandir(variants_dir) as it:
+        for entry in it:
+            if entry.is_file() and not entry.name.endswith(".part"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    target = COVER_VARIANT_CACHE_MAX_BYTES * COVER_VARIANT_CACHE_LOW_WATER
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    _variant_cache_bytes = total
+    if removed:
+        log.info(f"COVERS: Evicted {removed} cover variant(s), cache is now {total // (1024 * 1024)} MB.")
+
+
+def _account_cover_variant(variants_dir, size):
+    """Adds a new variant to the cache size and evicts old variants if the cache is over its limit."""
+    global _variant_cache_bytes
+    with _variant_cache_lock:
+        if _variant_cache_bytes is None:
+            # First variant since startup: measure the cache as it is on disk (this also trims it).
+            _evict_cover_variants(variants_dir)
+        else:
+            _variant_cache_bytes += size
+            if _variant_cache_bytes > COVER_VARIANT_CACHE_MAX_BYTES:
+                _evict_cover_variants(variants_dir)
+
+
+def get_cover_variant(asin, width=None, fmt="jpg", covers_dir=COVERS_DIR, variants_dir=COVER_VARIANTS_DIR):
+    """
+    Returns a cached cover variant of a given width and format, creating it if needed.
+
+    Args:
+        asin (str): The book's ASIN.
+        width (int): The requested width in pixels. It is rounded up to a size from COVER_VARIANT_WIDTHS.
+        fmt (str): A key of COVER_VARIANT_FORMATS.
+        covers_dir (str): Where the synced originals and thumbnails are stored.
+        variants_dir (str): Where the variant cache is stored.
+
+    Returns:
+        tuple: (path, mimetype) of the variant, or None if there is no source cover or scaling failed.
+    """
+    source_path = _cover_variant_source(asin, covers_dir)
+    if source_path is None:
+        return None
+    width = _snap_variant_width(width or COVER_VARIANT_WIDTHS[-1])
+    variant_path = os.path.join(variants_dir, f"{asin}_{width}.{fmt}")
+    mimetype = COVER_VARIANT_FORMATS[fmt]
+
+    try:
+        variant_mtime = os.path.getmtime(variant_path)
+    except OSError:
+        variant_mtime = None
+    # A variant is stale once the cover it was made from has been replaced by a newer download.
+    if variant_mtime is not None and variant_mtime >= os.path.getmtime(source_path):
+        now = time.time()
+        if now - variant_mtime > COVER_VARIANT_TOUCH_INTERVAL:
+            try:
+                os.utime(variant_path, (now, now))
+            except OSError:
+                pass
+        return variant_path, mimetype
+
+    os.makedirs(variants_dir, exist_ok=True)
+    # Concurrent requests for the same variant each write their own temp file; the last rename wins.
+    temp_path = f"{variant_path}.{uuid.uuid4().hex}.part"
+    command = [
+        "ffmpeg",
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-i",
+        source_path,
+        "-vf",
+        f"scale='min(iw,{width})':-2",
+        "-frames:v",
+        "1",
+        "-f",
+        "webp" if fmt == "webp" else "mjpeg",
+        temp_path,
+    ]
+    try:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        os.replace(temp_path, variant_path)
+    except (subprocess.CalledProcessError, OSError) as e:
+        stderr = e.stderr.decode(errors="replace").strip() if isinstance(e, subprocess.CalledProcessError) else e
+        log.warning(f"COVERS: Could not create {width}px {fmt} variant for {asin}: {stderr}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+
+    _account_cover_variant(variants_dir, os.path.getsize(variant_path))
+    return variant_path, mimetype
+
+
+def _load_atlas_members(con, sheet=None):
+    """
+    Returns {sheet: {slot: (asin, thumb_mtime)}} for every cover placed in the atlas.
+    Covers whose thumbnail is not known to the manifest are left out.
+    """
+    query = """
+        SELECT a.asin, a.sheet, a.slot, m.thumb_mtime
+        FROM cover_atlas a JOIN cover_manifest m ON a.asin = m.asin
+        WHERE m.thumb_mtime IS NOT NULL
+    """
+    params = ()
+    if sheet is not None:
+        query += " AND a.sheet = ?"
+        params = (sheet,)
+    sheets = {}
+    for row in con.execute(query, params).fetchall():
+        sheets.setdefault(row["sheet"], {})[row["slot"]] = (row["asin"], row["thumb_mtime"])
+    return sheets
+
+
+def _atlas_sheet_version(members):
+    """A short hash of a sheet's layout and thumbnail mtimes. It changes whenever the sheet must be rebuilt."""
+    signature = "|".join(f"{slot}:{asin}:{mtime}" for slot, (asin, mtime) in sorted(members.items()))
+    return hashlib.sha1(signature.encode("utf-8")).hexdigest()[:16]
+
+
+def _assign_atlas_slots(con):
+    """Places covers that have a thumbnail but no atlas slot yet after the last used slot."""
+    unplaced = con.execute(
+        """
+        SELECT m.asin FROM cover_manifest m LEFT JOIN cover_atlas a ON m.asin = a.asin
+        WHERE m.thumb_mtime IS NOT NULL AND a.asin IS NULL ORDER BY m.asin
+        """
+    ).fetchall()
+    if not unplaced:
+        return
+    last = con.execute("SELECT MAX(sheet * ? + slot) FROM cover_atlas", (ATLAS_SHEET_SIZE,)).fetchone()[0]
+    position = -1 if last is None else last
+    rows = []
+    for row in unplaced:
+        position += 1
+        rows.append((row["asin"], position // ATLAS_SHEET_SIZE, position % ATLAS_SHEET_SIZE))
+    con.executemany("INSERT INTO cover_atlas (asin, sheet, slot) VALUES (?, ?, ?)", rows)
+    con.commit()
+    log.info(f"COVERS: Placed {len(rows)} new cover(s) in the cover atlas.")
+
+
+def get_cover_atlas():
+    """
+    Returns the cover atlas layout for the library grid.
+
+    Returns:
+        dict: 'tile' and 'columns' describe the sheet grid, 'sheets' maps each sheet number to its
+        versioned 'url' and 'rows', and 'covers' maps an ASIN to its [sheet, column, row].
+    """
+    # Read-only: slots are assigned when the cover manifest is saved (see CoverPipeline._save_manifest).
+    with get_db_connection() as con:
+        members_by_sheet = _load_atlas_members(con)
+
+    sheets = {}
+    covers = {}
+    for sheet, members in members_by_sheet.items():
+        sheets[sheet] = {
+            "url": f"/covers/atlas/{sheet}.webp?v={_atlas_sheet_version(members)}",
+            "rows": math.ceil((max(members) + 1) / ATLAS_COLUMNS),
+        }
+        for slot, (asin, _) in members.items():
+            covers[asin] = [sheet, slot % ATLAS_COLUMNS, slot // ATLAS_COLUMNS]
+    return {"tile": ATLAS_TILE_SIZE, "columns": ATLAS_COLUMNS, "sheets": sheets, "covers": covers}
+
+
+def get_cover_atlas_sheet(sheet, covers_dir=COVERS_DIR, atlas_dir=COVER_ATLAS_DIR):
+    """
+    Returns the path of an atlas sheet image, building it first if its covers changed.
+
+    Args:
+        sheet (int): The sheet number.
+
+    Returns:
+        str: The path of the sheet, or None if the sheet is empty or could not be built.
+    """
+    with get_db_connection() as con:
+        members = _load_atlas_members(con, sheet).get(sheet)
+    if not members:
+        return None
+    sheet_path = os.path.join(atlas_dir, f"sheet_{sheet}_{_atlas_sheet_version(members)}.webp")
+    if os.path.exists(sheet_path):
+        return sheet_path
+
+    # Only one request builds a given sheet; the others wait for it and then serve the result.
+    with _atlas_lock:
+        sheet_lock = _atlas_sheet_locks.setdefault(sheet, Lock())
+    with sheet_lock:
+        if os.path.exists(sheet_path):
+            return sheet_path
+        os.makedirs(atlas_dir, exist_ok=True)
+        slot_count = max(members) + 1
+        rows = math.ceil(slot_count / ATLAS_COLUMNS)
+        tile = f"{ATLAS_TILE_SIZE}:{ATLAS_TILE_SIZE}"
+
+        # Each slot becomes one frame, and the tile filter lays the frames out row by row.
+        command = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"]
+        filters = []
+        input_index = 0
+        for slot in range(slot_count):
+            asin = members.get(slot, (None, None))[0]
+            thumb_path = cover_paths(asin, covers_dir)[1] if asin else None
+            if thumb_path and os.path.exists(thumb_path):
+                command += ["-i", thumb_path]
+                filters.append(f"[{input_index}:v]scale={tile},setsar=1,format=yuv420p[s{slot}]")
+                input_index += 1
+            else:
+                filters.append(
+                    f"color=c={ATLAS_PLACEHOLDER_COLOR}:s={ATLAS_TILE_SIZE}x{ATLAS_TILE_SIZE},"
+                    f"trim=end_frame=1,setsar=1,format=yuv420p[s{slot}]"
+                )
+        stream_labels = "".join(f"[s{slot}]" for slot in range(slot_count))
+        filters.append(f"{stream_labels}concat=n={slot_count}:v=1:a=0,tile={ATLAS_COLUMNS}x{rows}[atlas]")
+
+        temp_path = f"{sheet_path}.part"
+        command += [
+            "-filter_complex",
+            ";".join(filters),
+            "-map",
+            "[atlas]",
+            "-frames:v",
+            "1",
+            "-f",
+            "webp",
+            temp_path,
+        ]
+        try:
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            os.replace(temp_path, sheet_path)
+        except (subprocess.CalledProcessError, OSError) as e:
+            stderr = e.stderr.decode(errors="replace").strip() if isinstance(e, subprocess.CalledProcessError) else e
+            log.warning(f"COVERS: Could not build cover atlas sheet {sheet}: {stderr}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+
+        # Remove the previous versions of this sheet.
+        prefix = f"sheet_{sheet}_"
+        for name in os.listdir(atlas_dir):
+            if name.startswith(prefix) and os.path.join(atlas_dir, name) != sheet_path:
+                try:
+                    os.remove(os.path.join(atlas_dir, name))
+                except OSError:
+                    pass
+        log.info(f"COVERS: Built cover atlas sheet {sheet} with {len(members)} cover(s).")
+    return sheet_path
+
+
+class CoverPipeline:
+    """
+    A background stage that downloads covers and creates their thumbnails.
+    Covers are submitted while the library is being synced, and the caller
+    drains the pipeline once all metadata has been written.
+
+    The cover_manifest table records where each cover came from, so most books are
+    skipped with a dictionary lookup. Known covers are revalidated with a conditional
+    GET once they are older than COVER_REVALIDATE_AFTER, and a thumbnail is only
+    regenerated when the upstream image actually changed.
+    """
+
+    def __init__(self, job_id, covers_dir=COVERS_DIR, max_workers=COVER_DOWNLOAD_WORKERS):
+        self.job_id = job_id
+        self.covers_dir = covers_dir
+        os.makedirs(self.covers_dir, exist_ok=True)
+
+        # One shared session with a connection pool sized to the worker count.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cover")
+        self._lock = Lock()
+        self._futures = []
+        self._thumbnail_queue = []
+        self.failed = 0
+
+        # The whole manifest is read with one query; updates are written back in one batch by drain().
+        with get_db_connection() as con:
+            rows = con.execute(f"SELECT asin, {', '.join(MANIFEST_COLUMNS)} FROM cover_manifest").fetchall()
+        self._manifest = {row["asin"]: dict(row) for row in rows}
+        self._manifest_updates = {}
+
+    def submit(self, asin, cover_url):
+        """Queues a book's cover for download or revalidation if the manifest says it is needed."""
+        if not cover_url:
+            return
+        entry = self._manifest.get(asin)
+        now = time.time()
+
+        if entry is None:
+            # Adopt covers that were downloaded before the manifest existed instead of fetching them again.
+            original_path, thumb_path = cover_paths(asin, self.covers_dir)
+            if os.path.exists(thumb_path) and os.path.exists(original_path):
+                self._record(
+                    asin,
+                    source_url=cover_url,
+                    etag=None,
+                    last_modified=None,
+                    size=os.path.getsize(original_path),
+                    thumb_mtime=os.path.getmtime(thumb_path),
+                    checked_at=now,
+                )
+                return
+        elif entry["source_url"] == cover_url and now - (entry["checked_at"] or 0) < COVER_REVALIDATE_AFTER:
+            return
+
+        # A changed URL means new artwork, so only revalidate conditionally when the URL is the same.
+        conditional = entry if entry and entry["source_url"] == cover_url else None
+        self._futures.append(self.executor.submit(self._download, asin, cover_url, conditional))
+
+    def _record(self, asin, **fields):
+        """Stages a manifest update for a cover. It is written to the DB when the pipeline drains."""
+        with self._lock:
+            entry = self._manifest_updates.get(asin) or dict(self._manifest.get(asin) or {})
+            entry.update(fields)
+            self._manifest_updates[asin] = entry
+
+    def _download(self, asin, cover_url, conditional=None):
+        """Worker: fetches one original cover and hands it to the thumbnail batcher if it changed."""
+        original_path, thumb_path = cover_paths(asin, self.covers_dir)
+        headers = {}
+        # Without a thumbnail on disk there is nothing to revalidate, so fetch the image in full.
+        if conditional and os.path.exists(thumb_path):
+            if conditional["etag"]:
+                headers["If-None-Match"] = conditional["etag"]
+            if conditional["last_modified"]:
+                headers["If-Modified-Since"] = conditional["last_modified"]
+        try:
+            response = self.session.get(cover_url, headers=headers, timeout=30)
+            if response.status_code == 304:
+                self._record(asin, checked_at=time.time())
+                return
+            response.raise_for_status()
+            content = response.content
+
+            # Servers without validators still send the full image, so compare it with the copy on disk.
+            unchanged = False
+            if os.path.exists(thumb_path) and os.path.exists(original_path):
+                if os.path.getsize(original_path) == len(content):
+                    with open(original_path, "rb") as f:
+                        unchanged = f.read() == content
+            if not unchanged:
+                temp_path = f"{original_path}.part"
+                with open(temp_path, "wb") as f:
+                    f.write(content)
+                os.replace(temp_path, original_path)
+        except (requests.exceptions.RequestException, OSError) as e:
+            log.warning(f"COVERS ({self.job_id}): Could not download cover for {asin}: {e}")
+            with self._lock:
+                self.failed += 1
+            return
+
+        self._record(
+            asin,
+            source_url=cover_url,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            size=len(content),
+            checked_at=time.time(),
+        )
+        if unchanged:
+            return
+
+        # The worker that completes a batch also scales it, so thumbnails are made
+        # while other covers are still downloading.
+        batch = None
+        with self._lock:
+            self._thumbnail_queue.append(asin)
+            if len(self._thumbnail_queue) >= THUMBNAIL_BATCH_SIZE:
+                batch, self._thumbnail_queue = self._thumbnail_queue, []
+        if batch:
+            self._thumbnail_batch(batch)
+
+    def _thumbnail_batch(self, batch):
+        """Creates the thumbnails for a batch of downloaded covers and records their mtimes."""
+        failed = set(make_thumbnails(batch, self.covers_dir))
+        for asin in batch:
+            if asin in failed:
+                log.warning(f"COVERS ({self.job_id}): Could not create thumbnail for {asin}.")
+                # Forget the validators so the cover is fetched in full again next time.
+                self._record(asin, etag=None, last_modified=None, checked_at=0)
+                with self._lock:
+                    self.failed += 1
+            else:
+                self._record(asin, thumb_mtime=os.path.getmtime(cover_paths(asin, self.covers_dir)[1]))
+
+    def _save_manifest(self):
+        """
+        Writes all staged manifest updates with a single executemany() upsert, then places
+        covers that have a thumbnail but no atlas slot yet, so reading the atlas never writes.
+        """
+        with self._lock:
+            updates, self._manifest_updates = self._manifest_updates, {}
+        columns = ", ".join(MANIFEST_COLUMNS)
+        assignments = ", ".join(f"{col} = excluded.{col}" for col in MANIFEST_COLUMNS)
+        sql = (
+            f"INSERT INTO cover_manifest (asin, {columns}) VALUES (?, {', '.join('?' for _ in MANIFEST_COLUMNS)}) "
+            f"ON CONFLICT(asin) DO UPDATE SET {assignments}"
+        )
+        with _atlas_lock, get_db_connection() as con:
+            if updates:
+                con.executemany(
+                    sql,
+                    [(asin,) + tuple(entry.get(col) for col in MANIFEST_COLUMNS) for asin, entry in updates.items()],
+                )
+                con.commit()
+            _assign_atlas_slots(con)
+
+    def drain(self):
+        """
+        Generator that waits for every submitted cover to finish.
+        Yields (completed, total) while waiting, then saves the manifest and closes the pipeline.
+        """
+        total = len(self._futures)
+        try:
+            last_reported = -1
+            while True:
+                completed = sum(1 for future in self._futures if future.done())
+                if completed != last_reported:
+                    yield completed, total
+                    last_reported = completed
+                if completed == total:
+                    break
+                time.sleep(0.5)
+
+            # Scale whatever is left over from the last partial batch.
+            with self._lock:
+                batch, self._thumbnail_queue = self._thumbnail_queue, []
+            self._thumbnail_batch(batch)
+            self._save_manifest()
+            log.info(f"COVERS ({self.job_id}): Processed {total} cover(s), {self.failed} failed.")
+        finally:
+            self.close()
+
+    def close(self):
+        """Stops the workers, saves the manifest entries of finished covers and closes the shared session."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self._save_manifest()
+        self.session.close()
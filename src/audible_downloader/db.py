@@ -14,10 +14,15 @@ from .logger import log
 # --- Database Helper Functions (Centralized) ---
 # This module contains all functions that directly interact with the SQLite database.
 
+# How long a connection waits for another connection's write lock before giving up.
+DB_LOCK_TIMEOUT_SEC = 30
+
 
 def get_db_connection():
     """Establishes and returns a connection to the SQLite database."""
-    con = sqlite3.connect(DB_FILE)
+    # Sync phases, the cover pipeline and the library watcher write from different threads,
+    # so wait for a competing write to finish instead of failing after the default 5 seconds.
+    con = sqlite3.connect(DB_FILE, timeout=DB_LOCK_TIMEOUT_SEC)
     # Use the Row factory to access columns by name
     con.row_factory = sqlite3.Row
     return con
@@ -39,6 +44,17 @@ def get_db_stats():
     return stats
 
 
+def build_cover_url(asin, width, thumb_mtime=None):
+    """
+    Builds the URL of a cover variant. The thumbnail's mtime from the cover manifest is added
+    as a version, so a changed cover gets a new URL and browsers may cache each version for long.
+    """
+    url = f"/covers/{asin}?w={width}&fmt=webp"
+    if thumb_mtime:
+        url += f"&v={int(thumb_mtime)}"
+    return url
+
+
 def get_all_books():
     """Retrieves all books from the database for display in the library."""
     if not os.path.exists(DB_FILE):
@@ -47,8 +63,9 @@ def get_all_books():
     cur = con.cursor()
     # Select only the columns needed for the main library grid to be efficient
     cur.execute(
-        "SELECT author, title, status, asin, series, narrator, runtime_min, release_date, date_added "
-        "FROM audiobooks ORDER BY author, title"
+        "SELECT a.author, a.title, a.status, a.asin, a.series, a.narrator, a.runtime_min, a.release_date, "
+        "a.date_added, m.thumb_mtime FROM audiobooks a LEFT JOIN cover_manifest m ON a.asin = m.asin "
+        "ORDER BY a.author, a.title"
     )
     books_from_db = cur.fetchall()
     con.close()
@@ -56,7 +73,7 @@ def get_all_books():
     # Append the cover URL, which is not stored in the DB but follows a known pattern
     for book in books_from_db:
         book_dict = dict(book)
-        book_dict["cover_url"] = f"/covers/{book_dict['asin']}_thumb.jpg"
+        book_dict["cover_url"] = build_cover_url(book_dict["asin"], 200, book_dict.pop("thumb_mtime"))
         books_with_covers.append(book_dict)
     return books_with_covers
 
@@ -105,6 +122,21 @@ def cleanup_stale_jobs():
     finally:
         con.close()
 
+
+def get_sync_state(con, key, default=None):
+    """Reads a single value from the sync_state key/value table."""
+    row = con.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else default
+
+
+def set_sync_state(con, key, value):
+    """Writes a single value to the sync_state key/value table. The caller commits."""
+    con.execute(
+        "INSERT INTO sync_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+
 def _get_books_by_status(statuses, include_errored_retries=False):
     """
     A private helper function to fetch books with specific statuses.
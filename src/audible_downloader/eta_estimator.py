@@ -11,6 +11,8 @@ from .logger import log
 ETA_CACHE_FILE = os.path.join(CONFIG_DIR, ".eta_cache.json")
 # The number of recent conversions to keep for averaging
 HISTORY_LENGTH = 30
+# The "auto" encode strategy benchmarks each strategy on this many books before comparing them.
+BENCHMARK_MIN_SAMPLES = 2
 
 
 def _load_cache():
@@ -34,13 +36,15 @@ def _save_cache(data):
         log.error("ETA_ESTIMATOR: Could not write to ETA cache file.")
 
 
-def record_conversion_time(runtime_min, duration_sec):
+def record_conversion_time(runtime_min, duration_sec, strategy=None):
     """
     Records the performance of a completed conversion to improve future estimates.
 
     Args:
         runtime_min (int): The total runtime of the audiobook in minutes.
         duration_sec (int): The time the conversion process took in seconds.
+        strategy (str, optional): The encode strategy used, kept in its own history
+            so the "auto" strategy can compare them on this host.
     """
     if not runtime_min or not duration_sec or runtime_min == 0:
         return
@@ -54,8 +58,37 @@ def record_conversion_time(runtime_min, duration_sec):
     history.append(rate)
 
     cache["conversion_rates"] = list(history)
+    if strategy:
+        strategy_rates = cache.setdefault("strategy_rates", {})
+        strategy_history = deque(strategy_rates.get(strategy, []), maxlen=HISTORY_LENGTH)
+        strategy_history.append(rate)
+        strategy_rates[strategy] = list(strategy_history)
     _save_cache(cache)
-    log.info(f"ETA_ESTIMATOR: Recorded new conversion rate: {rate:.2f} sec/min")
+    log.info(f"ETA_ESTIMATOR: Recorded new conversion rate: {rate:.2f} sec/min ({strategy or 'unknown'} strategy)")
+
+
+def choose_encode_strategy(strategies):
+    """
+    Picks the faster encode strategy on this host from the recorded conversion rates.
+    A strategy with fewer than BENCHMARK_MIN_SAMPLES recorded books is picked first,
+    so every strategy gets benchmarked before they are compared.
+
+    Args:
+        strategies (tuple): The strategy names to choose from, in order of preference.
+
+    Returns:
+        str: The chosen strategy.
+    """
+    strategy_rates = _load_cache().get("strategy_rates", {})
+    for strategy in strategies:
+        if len(strategy_rates.get(strategy, [])) < BENCHMARK_MIN_SAMPLES:
+            log.info(f"ETA_ESTIMATOR: Benchmarking the {strategy} encode strategy.")
+            return strategy
+    averages = {strategy: sum(strategy_rates[strategy]) / len(strategy_rates[strategy]) for strategy in strategies}
+    chosen = min(strategies, key=lambda strategy: averages[strategy])
+    summary = ", ".join(f"{strategy} {rate:.2f} sec/min" for strategy, rate in averages.items())
+    log.info(f"ETA_ESTIMATOR: Chose the {chosen} encode strategy ({summary}).")
+    return chosen
 
 
 def estimate_conversion_time(runtime_min):
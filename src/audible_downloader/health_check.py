@@ -1,11 +1,9 @@
 # audible_downloader/health_check.py
 
-import os
-import subprocess
 import time
 from threading import Lock
 
-from . import DATABASE_DIR
+from .audible_api import AudibleApiError, AudibleApiTimeoutError, get_api_client
 from .logger import log
 
 # --- State Management for Auth Health ---
@@ -27,55 +25,38 @@ def get_audible_auth_status():
 
 def perform_audible_auth_check():
     """
-    The core logic that runs audible-cli to check the auth status.
+    The core logic that calls the Audible API to check the auth status.
     This function updates the global _auth_status dictionary.
     """
     log.info("AUDIBLE_AUTH_CHECK: Performing periodic Audible connection status check...")
     try:
-        # 1. Copy the current process's environment. This preserves the PATH.
-        env = os.environ.copy()
-        # 2. Set/override the HOME variable to our persistent config directory.
-        env["HOME"] = DATABASE_DIR
-
-        result = subprocess.run(
-            ["audible", "api", "/1.0/customer/status", "-p", "response_groups=benefits_status"],
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            env=env,
-            timeout=30,
-        )
-
-        is_valid_now = result.returncode == 0
-        error_message = ""
-
-        if not is_valid_now:
-            raw_error = result.stderr or result.stdout
-            if "token has been expired" in raw_error:
-                error_message = "Your Audible authentication token has expired. Please re-authenticate."
-            else:
-                error_message = "Authentication with Audible is invalid. Please check the logs and re-authenticate."
-            log.warning(f"HEALTH_CHECK: Auth check failed. Message: {error_message}")
-        else:
-            log.info("HEALTH_CHECK: Authentication status is valid.")
+        # Use the shared in-process client, which reuses its pooled session between checks.
+        get_api_client().get("/1.0/customer/status", response_groups="benefits_status")
+        log.info("HEALTH_CHECK: Authentication status is valid.")
 
         # Update the shared state dictionary safely
         with _auth_status_lock:
-            _auth_status["is_valid"] = is_valid_now
-            _auth_status["error"] = error_message
+            _auth_status["is_valid"] = True
+            _auth_status["error"] = ""
             _auth_status["last_checked"] = time.time()
 
-    except FileNotFoundError:
+    except AudibleApiTimeoutError:
         with _auth_status_lock:
             _auth_status["is_valid"] = False
-            _auth_status["error"] = "'audible-cli' not found in the system's PATH."
-    except subprocess.TimeoutExpired:
+            _auth_status["error"] = "The authentication check timed out."
+            _auth_status["last_checked"] = time.time()
+    except AudibleApiError as e:
+        if "expired" in str(e).lower():
+            error_message = "Your Audible authentication token has expired. Please re-authenticate."
+        else:
+            error_message = "Authentication with Audible is invalid. Please check the logs and re-authenticate."
+        log.warning(f"HEALTH_CHECK: Auth check failed. Message: {error_message} Details: {e}")
         with _auth_status_lock:
             _auth_status["is_valid"] = False
-            _auth_status["error"] = "The authentication check timed out."
+            _auth_status["error"] = error_message
+            _auth_status["last_checked"] = time.time()
     except Exception as e:
         log.error(f"HEALTH_CHECK: An unexpected error occurred: {e}", exc_info=True)
         with _auth_status_lock:
             _auth_status["is_valid"] = False
             _auth_status["error"] = "An unexpected error occurred during the authentication check."
-
@@ -37,7 +37,7 @@ def sync_worker(job_id, app_context, stop_event, job_params=None):
 
             success = False  # Default to failure
             # Pass the sync_mode to the sync logic function.
-            sync_generator = run_sync_logic(job_id, sync_mode=sync_mode)
+            sync_generator = run_sync_logic(job_id, sync_mode=sync_mode, job_params=job_params)
 
             while True:
                 try:
@@ -352,7 +352,7 @@ def start_new_job(job_type, asins=None, job_params=None):
                 ).fetchall()
                 for item in item_rows:
                     item_dict = dict(item)
-                    item_dict["cover_url"] = f"/covers/{item_dict['asin']}_thumb.jpg"
+                    item_dict["cover_url"] = f"/covers/{item_dict['asin']}?w=80&fmt=webp"
                     items_list.append(item_dict)
 
             # Announce the new job to all connected clients.
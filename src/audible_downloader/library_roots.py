@@ -0,0 +1,137 @@
+# audible_downloader/library_roots.py
+
+import os
+import shutil
+from threading import Lock
+
+from .logger import log
+from .settings import load_settings
+
+# --- Library Roots ---
+# The library can be spread over several directories (usually one per disk). Every root
+# is scanned by its own walker during a DEEP sync and watched by the library watcher.
+# New books are written to one root chosen by the 'library.output_placement' policy.
+
+DEFAULT_LIBRARY_ROOT = "/data"
+# "most_free_space" picks the root with the most free bytes. "least_load" picks the root
+# with the fewest books currently being written to it, and the most free space among those.
+PLACEMENT_POLICIES = ("most_free_space", "least_load")
+DEFAULT_PLACEMENT_POLICY = "most_free_space"
+
+# Root -> number of books currently being written to it by this process.
+_active_writes = {}
+_active_writes_lock = Lock()
+
+
+def get_library_roots(settings=None):
+    """
+    Returns the configured library roots as normalized absolute paths.
+
+    The setting may be a list or a comma/newline separated string. Duplicates and
+    roots nested inside another root are dropped, so no file is scanned twice.
+
+    Returns:
+        list: The library roots, never empty.
+    """
+    settings = settings if settings is not None else load_settings()
+    configured = settings.get("library", {}).get("roots") or [DEFAULT_LIBRARY_ROOT]
+    if isinstance(configured, str):
+        configured = configured.replace(",", "\n").splitlines()
+
+    roots = []
+    for root in configured:
+        root = str(root).strip()
+        if not root:
+            continue
+        if not os.path.isabs(root):
+            log.warning(f"LIBRARY: Ignoring library root '{root}' because it is not an absolute path.")
+            continue
+        root = os.path.normpath(root)
+        if root not in roots:
+            roots.append(root)
+
+    # Keep the configured order, which is also the order roots are shown in the logs.
+    unique_roots = []
+    for root in roots:
+        if any(is_path_under(root, other) for other in roots if other != root):
+            log.warning(f"LIBRARY: Ignoring library root '{root}' because it is inside another root.")
+            continue
+        unique_roots.append(root)
+    return unique_roots or [DEFAULT_LIBRARY_ROOT]
+
+
+def is_path_under(path, root):
+    """Returns True if path is root itself or lies below it."""
+    return path == root or path.startswith(root.rstrip("/") + "/")
+
+
+def like_path_prefix(directory):
+    """Returns a SQL LIKE pattern (with ESCAPE '\\') that matches every path below a directory."""
+    escaped = directory.rstrip("/").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}/%"
+
+
+def _is_writable_root(root):
+    """Returns True if a root is mounted (exists) and new books can be written to it."""
+    return os.path.isdir(root) and os.access(root, os.W_OK)
+
+
+def _free_bytes(root):
+    """Returns the free space of the filesystem a root lives on, or 0 if it cannot be read."""
+    try:
+        return shutil.disk_usage(root).free
+    except OSError:
+        return 0
+
+
+def acquire_output_root(relative_path, settings=None):
+    """
+    Chooses the library root a new book is written to and counts it as an active write.
+    Every call must be paired with release_output_root().
+
+    A book that already exists below one of the roots is written there again, so
+    re-processing a book replaces its file instead of leaving a copy on another disk.
+
+    Args:
+        relative_path (str): The book's output path relative to a library root.
+        settings (dict, optional): The settings to use instead of loading them.
+
+    Returns:
+        str: The chosen library root.
+
+    Raises:
+        OSError: If none of the roots is mounted and writable.
+    """
+    settings = settings if settings is not None else load_settings()
+    roots = get_library_roots(settings)
+    policy = settings.get("library", {}).get("output_placement", DEFAULT_PLACEMENT_POLICY)
+    if policy not in PLACEMENT_POLICIES:
+        log.warning(f"LIBRARY: Unknown output placement '{policy}', using '{DEFAULT_PLACEMENT_POLICY}'.")
+        policy = DEFAULT_PLACEMENT_POLICY
+
+    candidates = [root for root in roots if _is_writable_root(root)]
+    if not candidates:
+        raise OSError(f"None of the library roots is mounted and writable: {', '.join(roots)}")
+
+    with _active_writes_lock:
+        existing = next((root for root in candidates if os.path.exists(os.path.join(root, relative_path))), None)
+        if existing:
+            chosen = existing
+        else:
+            free_space = {root: _free_bytes(root) for root in candidates}
+            if policy == "least_load":
+                chosen = min(candidates, key=lambda root: (_active_writes.get(root, 0), -free_space[root]))
+            else:
+                chosen = max(candidates, key=lambda root: free_space[root])
+        _active_writes[chosen] = _active_writes.get(chosen, 0) + 1
+    return chosen
+
+
+def release_output_root(root):
+    """Marks a write started with acquire_output_root() as finished."""
+    with _active_writes_lock:
+        remaining = _active_writes.get(root, 0) - 1
+        if remaining > 0:
+            _active_writes[root] = remaining
+        else:
+            _active_writes.pop(root, None)
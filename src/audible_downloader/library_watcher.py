@@ -0,0 +1,292 @@
+# audible_downloader/library_watcher.py
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import subprocess
+import time
+from threading import Event, Lock, Thread
+
+from .db import get_db_connection
+from .library_roots import get_library_roots, like_path_prefix
+from .logger import log
+from .sync_logic import probe_audiobook_file, scan_cache_row, upsert_scan_cache
+
+# --- Live Library Watcher ---
+# An optional background thread that follows changes to the library through Linux inotify.
+# When an .m4b is added, moved or deleted, the file_scan_cache row and the book's
+# DOWNLOADED/MISSING status are updated right away, instead of waiting for the next DEEP sync.
+# inotify only reports changes made through this kernel, so changes made directly on a
+# network share's server are still picked up by the DEEP sync.
+
+# inotify event flags, from <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+# struct inotify_event: int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[len]
+EVENT_HEADER = struct.Struct("iIII")
+
+# Events are collected for this long after the last one before they are applied,
+# so a burst (e.g. a whole folder being moved) is handled in one DB transaction.
+DEBOUNCE_SEC = 2
+# ...but a constant stream of events is still applied at least this often.
+MAX_BATCH_DELAY_SEC = 10
+
+
+class LibraryWatcher:
+    """
+    Watches every directory below the library roots and keeps the file index current.
+
+    Args:
+        roots (list): The library directories to watch.
+    """
+
+    def __init__(self, roots):
+        self.roots = list(roots)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = None
+        self._watches = {}
+        self._stop_event = Event()
+        self._thread = None
+        # Paths with pending changes, applied in one batch once the events settle.
+        self._changed_files = set()
+        self._removed_files = set()
+        self._removed_dirs = set()
+        self._touched_dirs = set()
+        self._overflowed = False
+
+    def start(self):
+        """Creates the inotify instance and starts the event thread, which sets up the watches."""
+        fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self._fd = fd
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, name="library-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the event thread, which closes the inotify instance on its way out."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        log.info("LIBRARY_WATCHER: Stopped.")
+
+    def _watch_roots(self):
+        """Adds the watches for every library root. Walking a large library can take a while."""
+        for root in self.roots:
+            if not os.path.isdir(root):
+                log.warning(f"LIBRARY_WATCHER: Library root '{root}' is not available and will not be watched.")
+                continue
+            self._add_watches(root)
+        if not self._stop_event.is_set():
+            log.info(f"LIBRARY_WATCHER: Watching {len(self._watches)} directories below {', '.join(self.roots)}.")
+
+    def _add_watches(self, top):
+        """
+        Adds a watch to a directory and every directory below it.
+
+        Returns:
+            list: The .m4b files found while walking, for directories that appeared after startup.
+        """
+        found_files = []
+        pending_dirs = [top]
+        while pending_dirs and not self._stop_event.is_set():
+            directory = pending_dirs.pop()
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    log.error(
+                        "LIBRARY_WATCHER: Out of inotify watches. Raise fs.inotify.max_user_watches "
+                        "to watch the whole library."
+                    )
+                    break
+                log.warning(f"LIBRARY_WATCHER: Could not watch '{directory}': {os.strerror(error)}")
+                continue
+            self._watches[wd] = directory
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending_dirs.append(entry.path)
+                        elif entry.name.endswith(".m4b"):
+                            found_files.append(entry.path)
+            except OSError as e:
+                log.warning(f"LIBRARY_WATCHER: Could not list '{directory}': {e}")
+        return found_files
+
+    def _run(self):
+        """Registers the watches, then reads inotify events and applies them in debounced batches."""
+        try:
+            # Events for changes made while the watches are added queue up in the kernel until the loop reads them.
+            self._watch_roots()
+            self._event_loop()
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._watches.clear()
+
+    def _event_loop(self):
+        """Reads inotify events until the watcher is stopped."""
+        first_pending, last_event = None, None
+        while not self._stop_event.is_set():
+            try:
+                readable, _, _ = select.select([self._fd], [], [], 1)
+                if readable:
+                    self._handle_events(os.read(self._fd, 64 * 1024))
+                    last_event = time.monotonic()
+                    first_pending = first_pending or last_event
+                if first_pending is not None:
+                    now = time.monotonic()
+                    if now - last_event >= DEBOUNCE_SEC or now - first_pending >= MAX_BATCH_DELAY_SEC:
+                        self._apply_changes()
+                        first_pending = None
+            except Exception as e:
+                log.error(f"LIBRARY_WATCHER: Unexpected error while handling events: {e}", exc_info=True)
+                time.sleep(5)
+
+    def _handle_events(self, buffer):
+        """Parses a buffer of inotify events into the pending change sets."""
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            wd, mask, _, name_length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset : offset + name_length].rstrip(b"\0"))
+            offset += name_length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so no cached directory listing can be trusted any more.
+                log.warning("LIBRARY_WATCHER: Event queue overflowed. The next DEEP sync will re-list the library.")
+                self._overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            self._touched_dirs.add(directory)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files inside a directory that was moved in produce no events of their own.
+                    self._changed_files.update(self._add_watches(path))
+                elif mask & (IN_MOVED_FROM | IN_DELETE):
+                    self._removed_dirs.add(path)
+            elif name.endswith(".m4b"):
+                # A file is only probed once it has been completely written (or moved in whole).
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self._changed_files.add(path)
+                    self._removed_files.discard(path)
+                elif mask & (IN_MOVED_FROM | IN_DELETE):
+                    self._removed_files.add(path)
+                    self._changed_files.discard(path)
+
+    def _apply_changes(self):
+        """Applies the pending changes to file_scan_cache and the book statuses in one transaction."""
+        changed_files, self._changed_files = self._changed_files, set()
+        removed_files, self._removed_files = self._removed_files, set()
+        removed_dirs, self._removed_dirs = self._removed_dirs, set()
+        touched_dirs, self._touched_dirs = self._touched_dirs, set()
+        overflowed, self._overflowed = self._overflowed, False
+
+        # Probe outside the transaction; a file that vanished again in the meantime counts as removed.
+        cache_rows, found = [], {}
+        for filepath in changed_files:
+            try:
+                stat = os.stat(filepath)
+                probe = probe_audiobook_file(filepath, stat.st_size)
+            except FileNotFoundError:
+                removed_files.add(filepath)
+                continue
+            except (OSError, subprocess.CalledProcessError, ValueError) as e:
+                log.warning(f"LIBRARY_WATCHER: Could not process file '{filepath}': {e}")
+                continue
+            cache_rows.append(scan_cache_row(filepath, stat, probe))
+            if probe["asin"]:
+                found[probe["asin"]] = filepath
+
+        marked_missing, marked_downloaded = 0, 0
+        with get_db_connection() as con:
+            cur = con.cursor()
+            for directory in removed_dirs:
+                rows = cur.execute(
+                    "SELECT filepath FROM file_scan_cache WHERE filepath LIKE ? ESCAPE '\\'",
+                    (like_path_prefix(directory),),
+                ).fetchall()
+                removed_files.update(row["filepath"] for row in rows)
+                cur.execute(
+                    "DELETE FROM dir_scan_cache WHERE dirpath = ? OR dirpath LIKE ? ESCAPE '\\'",
+                    (directory, like_path_prefix(directory)),
+                )
+
+            # Found files first: a book whose file moved gets its new path, so the removal below no longer matches it.
+            upsert_scan_cache(cur, cache_rows)
+            cur.executemany(
+                "UPDATE audiobooks SET status = 'DOWNLOADED', filepath = ? "
+                "WHERE asin = ? AND (status != 'DOWNLOADED' OR filepath IS NOT ?)",
+                [(filepath, asin, filepath) for asin, filepath in found.items()],
+            )
+            marked_downloaded = cur.rowcount if found else 0
+
+            removed_files -= set(found.values())
+            cur.executemany("DELETE FROM file_scan_cache WHERE filepath = ?", [(p,) for p in removed_files])
+            cur.executemany(
+                "UPDATE audiobooks SET status = 'MISSING', filepath = '' WHERE filepath = ? AND status = 'DOWNLOADED'",
+                [(p,) for p in removed_files],
+            )
+            marked_missing = cur.rowcount if removed_files else 0
+
+            # The DEEP sync must re-list every directory whose entries changed.
+            cur.executemany("DELETE FROM dir_scan_cache WHERE dirpath = ?", [(d,) for d in touched_dirs])
+            if overflowed:
+                cur.execute("DELETE FROM dir_scan_cache")
+            con.commit()
+
+        log.info(
+            f"LIBRARY_WATCHER: Applied {len(cache_rows)} new/changed and {len(removed_files)} removed file(s). "
+            f"Marked Downloaded: {marked_downloaded}, Marked Missing: {marked_missing}"
+        )
+
+
+# --- Global Instance ---
+_library_watcher = None
+_library_watcher_lock = Lock()
+
+
+def apply_library_watcher_setting(settings):
+    """
+    Starts or stops the library watcher to match the 'job.sync.is_library_watcher_enabled'
+    setting, and restarts it when the library roots have changed.
+    """
+    global _library_watcher
+    enabled = settings.get("job", {}).get("sync", {}).get("is_library_watcher_enabled", False)
+    roots = get_library_roots(settings)
+    with _library_watcher_lock:
+        if _library_watcher is not None and (not enabled or _library_watcher.roots != roots):
+            _library_watcher.stop()
+            _library_watcher = None
+        if enabled and _library_watcher is None:
+            watcher = LibraryWatcher(roots)
+            try:
+                watcher.start()
+            except OSError as e:
+                log.error(f"LIBRARY_WATCHER: Could not start the library watcher: {e}")
+                return
+            _library_watcher = watcher
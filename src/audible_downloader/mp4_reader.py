@@ -0,0 +1,270 @@
+# audible_downloader/mp4_reader.py
+
+import os
+import struct
+
+# --- In-Process MP4/M4B Metadata Reader ---
+# Reads the ASIN tag, duration and chapter count of an .m4b straight from its box
+# structure, so the filesystem scan does not have to start an ffprobe process per file.
+# Only box headers and the few small boxes we need are read; everything else (most
+# importantly mdat and the sample tables of the audio track) is skipped with a seek.
+
+# Boxes larger than this are never read into memory (the tag values we need are tiny).
+MAX_READ_BOX_SIZE = 1024 * 1024
+# The tag name we are looking for, compared case-insensitively like ffprobe does.
+ASIN_TAG = "asin"
+
+
+class Mp4ParseError(Exception):
+    """Raised when a file is not a well-formed MP4 or uses a layout this reader does not handle."""
+
+
+def _iter_boxes(f, start, end):
+    """
+    Yields (box_type, payload_start, box_end) for the boxes between two file offsets.
+
+    Raises:
+        Mp4ParseError: If a box header is truncated or a box claims to extend past its parent.
+    """
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            raise Mp4ParseError(f"Truncated box header at offset {position}.")
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            large_size = f.read(8)
+            if len(large_size) < 8:
+                raise Mp4ParseError(f"Truncated 64-bit box size at offset {position}.")
+            size = struct.unpack(">Q", large_size)[0]
+            header_size = 16
+        elif size == 0:
+            # A size of zero means the box runs to the end of its parent.
+            size = end - position
+        if size < header_size or position + size > end:
+            raise Mp4ParseError(f"Invalid size {size} for box {box_type!r} at offset {position}.")
+        yield box_type, position + header_size, position + size
+        position += size
+
+
+def _read_payload(f, start, end):
+    """Reads a box payload, refusing boxes that are too large to be metadata."""
+    if end - start > MAX_READ_BOX_SIZE:
+        raise Mp4ParseError(f"Box at offset {start} is too large to read ({end - start} bytes).")
+    f.seek(start)
+    data = f.read(end - start)
+    if len(data) < end - start:
+        raise Mp4ParseError(f"Truncated box at offset {start}.")
+    return data
+
+
+def _find_child(f, start, end, box_type):
+    """Returns (payload_start, box_end) of the first child box of a type, or None."""
+    for child_type, child_start, child_end in _iter_boxes(f, start, end):
+        if child_type == box_type:
+            return child_start, child_end
+    return None
+
+
+def _parse_data_box(payload):
+    """Decodes the value of an ilst 'data' box as text."""
+    # 4 bytes type indicator + 4 bytes locale precede the value.
+    return payload[8:].decode("utf-8", errors="replace").strip("\x00").strip()
+
+
+def _read_meta_tags(f, start, end):
+    """
+    Reads the text tags of a 'meta' box, both the QuickTime 'mdta' keyed style that
+    ffmpeg writes with use_metadata_tags and iTunes '----' freeform atoms.
+
+    Returns:
+        dict: Lowercased tag names mapped to their values.
+    """
+    # The iTunes 'meta' is a full box with 4 bytes of version/flags; the QuickTime one is not.
+    f.seek(start)
+    peek = f.read(8)
+    if len(peek) == 8 and peek[4:8] != b"hdlr":
+        start += 4
+
+    keys = []
+    tags = {}
+    for box_type, box_start, box_end in _iter_boxes(f, start, end):
+        if box_type == b"keys":
+            payload = _read_payload(f, box_start, box_end)
+            (entry_count,) = struct.unpack_from(">I", payload, 4)
+            offset = 8
+            for _ in range(entry_count):
+                key_size = struct.unpack_from(">I", payload, offset)[0]
+                if key_size < 8 or offset + key_size > len(payload):
+                    raise Mp4ParseError("Invalid entry in 'keys' box.")
+                keys.append(payload[offset + 8 : offset + key_size].decode("utf-8", errors="replace"))
+                offset += key_size
+        elif box_type == b"ilst":
+            for item_type, item_start, item_end in _iter_boxes(f, box_start, box_end):
+                name, value = None, None
+                if item_type == b"----":
+                    for child_type, child_start, child_end in _iter_boxes(f, item_start, item_end):
+                        if child_type == b"name":
+                            # 'name' is a full box: skip version/flags.
+                            name = _read_payload(f, child_start, child_end)[4:].decode("utf-8", errors="replace")
+                        elif child_type == b"data" and value is None:
+                            value = _parse_data_box(_read_payload(f, child_start, child_end))
+                else:
+                    # In the 'mdta' style the item type is the 1-based index of its name in 'keys'.
+                    # 'keys' always precedes 'ilst', so the names are known at this point.
+                    index = struct.unpack(">I", item_type)[0]
+                    if 1 <= index <= len(keys):
+                        name = keys[index - 1]
+                        data = _find_child(f, item_start, item_end, b"data")
+                        if data:
+                            value = _parse_data_box(_read_payload(f, *data))
+                if name and value is not None:
+                    tags[name.lower()] = value
+    return tags
+
+
+def _read_mvhd_duration(f, start, end):
+    """Returns the movie duration in seconds from an 'mvhd' box."""
+    payload = _read_payload(f, start, end)
+    if payload[0] == 1:
+        timescale, duration = struct.unpack_from(">IQ", payload, 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", payload, 12)
+    if not timescale:
+        raise Mp4ParseError("The 'mvhd' box has a timescale of zero.")
+    return duration / timescale
+
+
+def _read_track(f, start, end):
+    """Returns (track_id, chapter_track_ids, sample_count) for a 'trak' box."""
+    track_id, chapter_track_ids, sample_count = None, [], None
+    for box_type, box_start, box_end in _iter_boxes(f, start, end):
+        if box_type == b"tkhd":
+            payload = _read_payload(f, box_start, box_end)
+            # The track ID follows the creation and modification times, which are 64-bit in version 1.
+            track_id = struct.unpack_from(">I", payload, 20 if payload[0] == 1 else 12)[0]
+        elif box_type == b"tref":
+            chap = _find_child(f, box_start, box_end, b"chap")
+            if chap:
+                payload = _read_payload(f, *chap)
+                chapter_track_ids = list(struct.unpack(f">{len(payload) // 4}I", payload[: len(payload) // 4 * 4]))
+        elif box_type == b"mdia":
+            minf = _find_child(f, box_start, box_end, b"minf")
+            stbl = minf and _find_child(f, *minf, b"stbl")
+            stts = stbl and _find_child(f, *stbl, b"stts")
+            if stts:
+                stts_start, stts_end = stts
+                # Only the audio track has a large 'stts'; reading its header is enough to skip it.
+                f.seek(stts_start)
+                header = f.read(8)
+                (entry_count,) = struct.unpack_from(">I", header, 4)
+                if entry_count * 8 <= MAX_READ_BOX_SIZE:
+                    payload = _read_payload(f, stts_start, stts_end)
+                    sample_count = sum(struct.unpack_from(">I", payload, 8 + i * 8)[0] for i in range(entry_count))
+    return track_id, chapter_track_ids, sample_count
+
+
+def _read_chpl_count(f, start, end):
+    """Returns the number of chapters in a Nero 'chpl' box."""
+    payload = _read_payload(f, start, end)
+    # Version 1 has 4 reserved bytes before the 8-bit chapter count.
+    return payload[8] if payload[0] == 1 else payload[4]
+
+
+def read_mp4_info(filepath):
+    """
+    Reads the ASIN tag, duration and chapter count of an MP4/M4B file without decoding it.
+
+    Args:
+        filepath (str): The audiobook file.
+
+    Returns:
+        dict: 'asin' (str or None), 'duration' (float seconds or None) and 'chapter_count' (int or None).
+
+    Raises:
+        Mp4ParseError: If the file cannot be parsed. Callers should fall back to ffprobe.
+        OSError: If the file cannot be read.
+    """
+    with open(filepath, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        # moov sits before mdat in faststart files and after it otherwise; mdat is skipped by seeking.
+        moov = _find_child(f, 0, file_size, b"moov")
+        if moov is None:
+            raise Mp4ParseError("No 'moov' box found.")
+
+        tags, duration, chpl_count = {}, None, None
+        tracks = {}
+        chapter_track_ids = []
+        try:
+            for box_type, box_start, box_end in _iter_boxes(f, *moov):
+                if box_type == b"mvhd":
+                    duration = _read_mvhd_duration(f, box_start, box_end)
+                elif box_type == b"meta":
+                    tags.update(_read_meta_tags(f, box_start, box_end))
+                elif box_type == b"udta":
+                    for child_type, child_start, child_end in _iter_boxes(f, box_start, box_end):
+                        if child_type == b"meta":
+                            tags.update(_read_meta_tags(f, child_start, child_end))
+                        elif child_type == b"chpl":
+                            chpl_count = _read_chpl_count(f, child_start, child_end)
+                elif box_type == b"trak":
+                    track_id, chapter_ids, sample_count = _read_track(f, box_start, box_end)
+                    tracks[track_id] = sample_count
+                    chapter_track_ids += chapter_ids
+        except (struct.error, IndexError) as e:
+            raise Mp4ParseError(f"Malformed metadata box: {e}") from e
+
+    # A chapter text track has one sample per chapter and is not limited to 255 like 'chpl'.
+    chapter_count = next((tracks[i] for i in chapter_track_ids if tracks.get(i) is not None), chpl_count)
+    return {"asin": tags.get(ASIN_TAG) or None, "duration": duration, "chapter_count": chapter_count}
+
+
+def read_audio_sample_table(filepath):
+    """
+    Reads the timing of the first audio track's samples (AAC frames) from its sample table.
+    The sample table is not encrypted in AAX/AAXC files, so this works on the download too.
+
+    Args:
+        filepath (str): The audiobook file.
+
+    Returns:
+        dict: 'timescale' (ticks per second) and 'stts', a list of (sample_count, sample_delta)
+        runs in ticks, in playback order.
+
+    Raises:
+        Mp4ParseError: If the file has no readable audio track.
+        OSError: If the file cannot be read.
+    """
+    with open(filepath, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        moov = _find_child(f, 0, file_size, b"moov")
+        if moov is None:
+            raise Mp4ParseError("No 'moov' box found.")
+        try:
+            for box_type, box_start, box_end in _iter_boxes(f, *moov):
+                if box_type != b"trak":
+                    continue
+                mdia = _find_child(f, box_start, box_end, b"mdia")
+                hdlr = mdia and _find_child(f, *mdia, b"hdlr")
+                # hdlr: version/flags, pre_defined, then the 4-character handler type.
+                if not hdlr or _read_payload(f, *hdlr)[8:12] != b"soun":
+                    continue
+                mdhd = _find_child(f, *mdia, b"mdhd")
+                minf = _find_child(f, *mdia, b"minf")
+                stbl = minf and _find_child(f, *minf, b"stbl")
+                stts = stbl and _find_child(f, *stbl, b"stts")
+                if not mdhd or not stts:
+                    raise Mp4ParseError("The audio track has no 'mdhd' or 'stts' box.")
+                payload = _read_payload(f, *mdhd)
+                timescale = struct.unpack_from(">I", payload, 20 if payload[0] == 1 else 12)[0]
+                payload = _read_payload(f, *stts)
+                (entry_count,) = struct.unpack_from(">I", payload, 4)
+                runs = [struct.unpack_from(">II", payload, 8 + i * 8) for i in range(entry_count)]
+                if not timescale or not runs:
+                    raise Mp4ParseError("The audio track has an empty sample table.")
+                return {"timescale": timescale, "stts": runs}
+        except (struct.error, IndexError) as e:
+            raise Mp4ParseError(f"Malformed sample table: {e}") from e
+    raise Mp4ParseError("No audio track found.")
@@ -17,19 +17,31 @@ from . import TEMP_DIR
 
 # Import the task-oriented functions and the global announcer
 from .chunked_conversion_logic import (
+    DEFAULT_TARGET_CHUNK_MINUTES,
+    SINGLE_PASS_MAX_THREADS,
     _yield_progress,
+    align_chunks_to_frames,
+    decrypt_source_once,
+    encode_book_single_pass,
     encode_chapter_chunk,
     merge_book_chunks,
+    plan_chunks,
     prepare_book_assets,
+    remux_book,
 )
 from .db import get_db_connection
-from .eta_estimator import record_conversion_time
+from .eta_estimator import choose_encode_strategy, record_conversion_time
+from .library_roots import acquire_output_root, release_output_root
 from .logger import log
 from .settings import load_settings
 
 # Import the task runner and task objects
 from .task_runner import Task, TaskPriority, task_runner
 
+# "chunked" encodes chunks in parallel ffmpeg processes and merges them; "single_process"
+# encodes the whole book in one multi-threaded ffmpeg. The first is the default.
+ENCODE_STRATEGIES = ("chunked", "single_process")
+
 
 def _sanitize_filename(name):
     """Sanitizes a string to be used as a valid filename."""
@@ -51,10 +63,15 @@ class BookProcessor:
         self.download_complete_event = download_complete_event
         self.temp_dir = None
         self.final_output_path = None
+        # The library root the book is written to, counted as an active write until run() returns.
+        self.output_root = None
         self.context = {}
         self.total_chunks = 0
         self.completed_chunks = 0
         self.encoded_chunk_paths = []
+        self.encode_strategy = None
+        # Set once the encode strategy is chosen, so the recorded rate covers the whole encode.
+        self.encode_start_time = None
         self._lock = Lock()
         self._completion_event = Event()
 
@@ -83,6 +100,9 @@ class BookProcessor:
             log.error(f"PROCESSOR ({self.asin}): A critical error occurred in the processor run: {e}", exc_info=True)
             self._update_db_on_failure(f"A critical error occurred: {e}")
         finally:
+            if self.output_root:
+                release_output_root(self.output_root)
+                self.output_root = None
             log.info(f"PROCESSOR ({self.asin}): Finished run method.")
 
     def _prepare_and_spawn_encode_tasks(self):
@@ -102,7 +122,9 @@ class BookProcessor:
             safe_author = _sanitize_filename(book_details["author"])
             safe_title = _sanitize_filename(book_details["title"])
             final_relative_path = template.replace("{author}", safe_author).replace("{title}", safe_title)
-            self.final_output_path = os.path.join("/data", f"{final_relative_path}.m4b")
+            self.output_root = acquire_output_root(f"{final_relative_path}.m4b", settings)
+            self.final_output_path = os.path.join(self.output_root, f"{final_relative_path}.m4b")
+            log.info(f"TASK-PREPARE ({self.asin}): Writing to library root '{self.output_root}'.")
             os.makedirs(os.path.dirname(self.final_output_path), exist_ok=True)
         except Exception as e:
             log.error(f"TASK-PREPARE ({self.asin}): Failed to get details or create path: {e}")
@@ -124,25 +146,69 @@ class BookProcessor:
             self._completion_event.set()
             return
 
-        # --- 3. Spawn all the ENCODE_CHAPTER tasks ---
-        chapters = self.context.get("chapters", [])
-        self.total_chunks = len(chapters)
-
-        _yield_progress(self.asin, f"Preparing to process {self.total_chunks} chunk(s)", 30, self.job_id)
+        # "Original" quality keeps the source's AAC audio, so there is nothing to encode:
+        # a single task remuxes the whole book instead of the chunk/merge fan-out.
+        if settings.get("conversion", {}).get("quality") == "Original":
+            _yield_progress(self.asin, "Preparing to remux the original audio", 30, self.job_id)
+            remux_task = Task(
+                priority=TaskPriority.MERGE_BOOK,
+                job_id=self.job_id,
+                func=self._remux_and_finalize,
+            )
+            task_runner.submit_task(remux_task)
+            log.info(f"TASK-PREPARE ({self.asin}): Submitted the remux task to the queue.")
+            return
 
-        if self.total_chunks == 0:
+        # --- 3. Plan the chunks and spawn the ENCODE_CHAPTER tasks ---
+        chapters = self.context.get("chapters", [])
+        if not chapters:
             log.warning(f"TASK-PREPARE ({self.asin}): Book has no chapter information. Cannot process.")
             self._update_db_on_failure("Book has no chapter information.")
             self._completion_event.set()
             return
 
-        for i, chapter in enumerate(chapters):
-            chunk_info = {
-                "index": i,
-                "total_chunks": self.total_chunks,
-                "start": chapter.get("start_offset_ms", 0) / 1000.0,
-                "duration": chapter.get("length_ms", 0) / 1000.0,
-            }
+        conversion_settings = settings.get("conversion", {})
+        total_cores = settings.get("job", {}).get("download", {}).get("total_processing_cores", 2)
+        if conversion_settings.get("is_auto_encode_strategy_enabled", False):
+            self.encode_strategy = choose_encode_strategy(ENCODE_STRATEGIES)
+        elif conversion_settings.get("is_chunked_conversion_enabled", True):
+            self.encode_strategy = "chunked"
+        else:
+            self.encode_strategy = "single_process"
+        # Timed from here for both strategies, so the chunked one's planning, alignment and
+        # decrypt-once count towards its rate like the single process's own setup does.
+        self.encode_start_time = time.time()
+
+        if self.encode_strategy == "single_process":
+            threads = max(1, min(total_cores, SINGLE_PASS_MAX_THREADS))
+            _yield_progress(self.asin, "Preparing to encode in a single process", 30, self.job_id)
+            single_pass_task = Task(
+                priority=TaskPriority.ENCODE_CHAPTER,
+                job_id=self.job_id,
+                func=self._encode_single_pass_and_finalize,
+                threads=threads,
+                cores=threads,
+            )
+            task_runner.submit_task(single_pass_task)
+            log.info(f"TASK-PREPARE ({self.asin}): Submitted the single-process encode task ({threads} cores).")
+            return
+
+        chunks = plan_chunks(
+            chapters,
+            total_cores=total_cores,
+            target_chunk_sec=conversion_settings.get("target_chunk_minutes", DEFAULT_TARGET_CHUNK_MINUTES) * 60,
+        )
+        # Align the cuts before an optional decrypt-once, which replaces the source file.
+        chunks = align_chunks_to_frames(self.asin, chunks, self.context)
+        self.total_chunks = len(chunks)
+        log.info(f"TASK-PREPARE ({self.asin}): Planned {self.total_chunks} chunk(s) from {len(chapters)} chapter(s).")
+        _yield_progress(self.asin, f"Preparing to process {self.total_chunks} chunk(s)", 30, self.job_id)
+
+        # Optionally decrypt the source once, so the chunk encoders do not each set up decryption.
+        if conversion_settings.get("is_decrypt_once_enabled", True):
+            decrypt_source_once(self.asin, self.job_id, self.temp_dir, self.context, self.total_chunks)
+
+        for chunk_info in chunks:
             encode_task = Task(
                 priority=TaskPriority.ENCODE_CHAPTER,
                 job_id=self.job_id,
@@ -184,19 +250,46 @@ class BookProcessor:
     def _merge_and_finalize(self):
         """The actual function for the MERGE_BOOK task."""
         log.info(f"TASK-MERGE ({self.asin}): Starting.")
-        conversion_start_time = time.time()
 
         success = merge_book_chunks(
             self.asin, self.job_id, self.temp_dir, self.final_output_path, self.context, self.encoded_chunk_paths
         )
 
         if success:
-            conversion_duration_sec = time.time() - conversion_start_time
-            with get_db_connection() as con:
-                runtime_row = con.execute("SELECT runtime_min FROM audiobooks WHERE asin = ?", (self.asin,)).fetchone()
-                if runtime_row:
-                    record_conversion_time(runtime_row["runtime_min"], conversion_duration_sec)
+            self._record_encode_time()
+        self._finalize(success, "Final merge of chapter chunks failed.")
+        log.info(f"TASK-MERGE ({self.asin}): Finalization complete.")
 
+    def _encode_single_pass_and_finalize(self, threads):
+        """The function for the encode task of the single-process strategy."""
+        log.info(f"TASK-ENCODE ({self.asin}): Starting single-process encode.")
+        success = encode_book_single_pass(
+            self.asin, self.job_id, self.temp_dir, self.final_output_path, self.context, threads
+        )
+        if success:
+            self._record_encode_time()
+        self._finalize(success, "Single-process encode failed.")
+        log.info(f"TASK-ENCODE ({self.asin}): Finalization complete.")
+
+    def _record_encode_time(self):
+        """Records the wall time from the first encode task to the finished file for the ETA and strategy history."""
+        conversion_duration_sec = time.time() - self.encode_start_time
+        with get_db_connection() as con:
+            runtime_row = con.execute("SELECT runtime_min FROM audiobooks WHERE asin = ?", (self.asin,)).fetchone()
+        if runtime_row:
+            record_conversion_time(runtime_row["runtime_min"], conversion_duration_sec, self.encode_strategy)
+
+    def _remux_and_finalize(self):
+        """The function for the remux task of the "Original" quality mode."""
+        log.info(f"TASK-REMUX ({self.asin}): Starting.")
+        # A remux is I/O-bound and far faster than encoding, so it is kept out of the encoding ETA history.
+        success = remux_book(self.asin, self.job_id, self.temp_dir, self.final_output_path, self.context)
+        self._finalize(success, "Remux of the original audio failed.")
+        log.info(f"TASK-REMUX ({self.asin}): Finalization complete.")
+
+    def _finalize(self, success, failure_message):
+        """Records the outcome of the final conversion step and unblocks the run method."""
+        if success:
             # On Success, update the database
             with get_db_connection() as con:
                 con.execute(
@@ -206,11 +299,10 @@ class BookProcessor:
                 )
             _yield_progress(self.asin, "Complete!", 100, self.job_id)
         else:
-            self._update_db_on_failure("Final merge of chapter chunks failed.")
+            self._update_db_on_failure(failure_message)
 
         # This is the final step, so we signal the main `run` method to unblock.
         self._completion_event.set()
-        log.info(f"TASK-MERGE ({self.asin}): Finalization complete.")
 
     def _update_db_on_failure(self, error_message):
         """Centralized method to update the database when any step fails."""
@@ -1,4 +1,3 @@
-import json
 import math
 import os
 import re
@@ -15,6 +14,7 @@ from flask import (  # type: ignore
     redirect,
     render_template,
     request,
+    send_file,
     send_from_directory,
     session,
     url_for,
@@ -35,11 +35,28 @@ from audible_downloader import (
     settings_changed_event,
 )
 
+# Import the shared in-process Audible API client
+from audible_downloader.audible_api import AudibleApiError, reset_api_client
+
 # --- Import the auth module and its functions ---
 from audible_downloader.auth import login_required, verify_credentials
 
+# Import the on-demand cover variant cache
+from audible_downloader.cover_logic import (
+    COVER_VARIANT_FORMATS,
+    get_cover_atlas,
+    get_cover_atlas_sheet,
+    get_cover_variant,
+)
+
 # Import the database helper functions from our new db module
-from audible_downloader.db import get_all_books, get_books_for_download_modal, get_db_connection, get_db_stats
+from audible_downloader.db import (
+    build_cover_url,
+    get_all_books,
+    get_books_for_download_modal,
+    get_db_connection,
+    get_db_stats,
+)
 
 # Import the authentication health check module
 from audible_downloader.health_check import get_audible_auth_status, perform_audible_auth_check
@@ -53,6 +70,12 @@ from audible_downloader.logger import log
 # Import the settings functions from the settings module
 from audible_downloader.settings import deep_update, load_settings, save_settings
 
+# Import the full summary helpers
+from audible_downloader.summary_logic import fetch_full_summaries, store_full_summaries
+
+# Import the targeted sync validation from the sync logic module
+from audible_downloader.sync_logic import parse_sync_target
+
 # Import the global task_runner instance
 from audible_downloader.task_runner import task_runner
 
@@ -186,7 +209,10 @@ def get_book_details(asin):
         return jsonify(error="Database not found."), 404
     con = get_db_connection()
     cur = con.cursor()
-    cur.execute("SELECT * FROM audiobooks WHERE asin = ?", (asin,))
+    cur.execute(
+        "SELECT a.*, m.thumb_mtime FROM audiobooks a LEFT JOIN cover_manifest m ON a.asin = m.asin WHERE a.asin = ?",
+        (asin,),
+    )
     book_from_db = cur.fetchone()
     con.close()
     if book_from_db is None:
@@ -194,12 +220,8 @@ def get_book_details(asin):
     book_dict = dict(book_from_db)
     if book_dict.get("is_summary_full") is None:
         book_dict["is_summary_full"] = 0
-    original_cover_path = f"/covers/{book_dict['asin']}_original.jpg"
-    thumb_cover_path = f"/covers/{book_dict['asin']}_thumb.jpg"
-    if os.path.exists(os.path.join(COVERS_DIR, f"{book_dict['asin']}_original.jpg")):
-        book_dict["cover_url_original"] = original_cover_path
-    else:
-        book_dict["cover_url_original"] = thumb_cover_path
+    # The variant endpoint scales from the original, or from the thumbnail if there is no original.
+    book_dict["cover_url_original"] = build_cover_url(book_dict["asin"], 500, book_dict.pop("thumb_mtime"))
     file_path = book_dict.get("filepath")
     if file_path and os.path.exists(file_path):
         try:
@@ -256,15 +278,16 @@ def get_active_job():
     if job_type == "DOWNLOAD":
         item_rows = con.execute(
             """
-            SELECT i.asin, i.status, a.title, a.author
+            SELECT i.asin, i.status, a.title, a.author, m.thumb_mtime
             FROM job_items i JOIN audiobooks a ON i.asin = a.asin
+            LEFT JOIN cover_manifest m ON i.asin = m.asin
             WHERE i.job_id = ?
         """,
             (job_id,),
         ).fetchall()
         for item in item_rows:
             item_dict = dict(item)
-            item_dict["cover_url"] = f"/covers/{item_dict['asin']}_thumb.jpg"
+            item_dict["cover_url"] = build_cover_url(item_dict["asin"], 80, item_dict.pop("thumb_mtime"))
             items_list.append(item_dict)
 
     con.close()
@@ -496,6 +519,14 @@ def start_job():
     elif job_type == "SYNC":
         # Get the job_params dictionary from the JSON payload sent by the frontend.
         job_params = data.get("job_params", {})
+        if not isinstance(job_params, dict):
+            return jsonify(error="'job_params' must be an object."), 400
+        if job_params.get("sync_mode") == "TARGETED":
+            # Reject a malformed target here instead of failing the job after it started.
+            try:
+                parse_sync_target(job_params)
+            except ValueError as e:
+                return jsonify(error=str(e)), 400
         # For a SYNC job, 'asins' is always None.
         success, result = start_new_job(job_type="SYNC", asins=None, job_params=job_params)
 
@@ -543,6 +574,9 @@ def reset_authentication():
             shutil.rmtree(audible_dir)
             log.info(f"Removed audible auth directory: {audible_dir}")
 
+        # Drop the cached API session so nothing keeps using the old credentials.
+        reset_api_client()
+
         return jsonify(success=True, message="Authentication has been reset. The application will now shut down.")
 
     except Exception as e:
@@ -560,9 +594,41 @@ def shutdown():
     return "Server shutting down..."
 
 
+# Browsers may reuse a cover served from a versioned URL ('&v=<thumb mtime>', see build_cover_url)
+# for this long. Unversioned URLs are revalidated with their ETag on every use, so a changed cover shows at once.
+COVER_CACHE_MAX_AGE = 7 * 24 * 3600
+# Matches '/covers/<asin>' as well as the legacy '/covers/<asin>_thumb.jpg' and '_original.jpg' names.
+COVER_FILENAME_PATTERN = re.compile(r"^([A-Za-z0-9]+?)(?:_thumb|_original)?(?:\.jpg)?$")
+
+
 @app.route("/covers/<path:filename>")
 def serve_cover(filename):
-    return send_from_directory(COVERS_DIR, filename)
+    """
+    Serves a cover image. With '?w=<width>' and/or '?fmt=jpg|webp' a resized variant is
+    made from the original on first request and served from the variant cache afterwards.
+    """
+    width = request.args.get("w", type=int)
+    fmt = request.args.get("fmt", "jpg").lower()
+    max_age = COVER_CACHE_MAX_AGE if "v" in request.args else 0
+    match = COVER_FILENAME_PATTERN.match(filename)
+    if match and (width or "fmt" in request.args or "." not in filename):
+        if fmt not in COVER_VARIANT_FORMATS:
+            return jsonify(error=f"Unsupported cover format '{fmt}'."), 400
+        variant = get_cover_variant(match.group(1), width, fmt)
+        if variant is None:
+            return jsonify(error="Cover not found."), 404
+        variant_path, mimetype = variant
+        return send_file(variant_path, mimetype=mimetype, max_age=max_age, conditional=True, etag=True)
+    return send_from_directory(COVERS_DIR, filename, max_age=max_age)
+
+
+@app.route("/covers/atlas/<int:sheet>.webp")
+def serve_cover_atlas_sheet(sheet):
+    """Serves one sprite sheet of the cover atlas. Its URL is versioned, so it can be cached for good."""
+    sheet_path = get_cover_atlas_sheet(sheet)
+    if sheet_path is None:
+        return jsonify(error="Cover atlas sheet not found."), 404
+    return send_file(sheet_path, mimetype="image/webp", max_age=365 * 24 * 3600, conditional=True, etag=True)
 
 
 def stream_script_output(script_path, script_name, args=None):
@@ -608,7 +674,7 @@ def get_page_data():
     stats = get_db_stats()
     books = get_all_books()
     stats_lower = {k.lower(): v for k, v in stats.items()}
-    return jsonify(stats=stats_lower, books=books)
+    return jsonify(stats=stats_lower, books=books, atlas=get_cover_atlas())
 
 
 @app.route("/api/downloadable_books")
@@ -664,24 +730,20 @@ def clear_log():
 @app.route("/api/fetch_full_summary/<string:asin>", methods=["POST"])
 @login_required
 def fetch_full_summary(asin):
-    command = ["audible", "api", f"/1.0/catalog/products/{asin}?response_groups=product_desc,product_extended_attrs"]
+    # Most summaries are already filled in by the background backfill; this fetches one that is not yet.
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True, encoding="utf-8")
-        data = json.loads(result.stdout)
-        full_summary_html = data.get("product", {}).get("publisher_summary")
-        if not full_summary_html:
-            return jsonify(error="Full summary not found in API response."), 404
-        cleaned_summary = re.sub("<[^<]+?>", "", full_summary_html).strip()
+        summaries = fetch_full_summaries([asin])
         con = get_db_connection()
-        cur = con.cursor()
-        cur.execute("UPDATE audiobooks SET summary = ?, is_summary_full = 1 WHERE asin = ?", (cleaned_summary, asin))
+        store_full_summaries(con.cursor(), summaries)
         con.commit()
         con.close()
-        return jsonify(success=True, summary=cleaned_summary)
-    except subprocess.CalledProcessError as e:
-        log.error(f"Error calling audible-cli for full summary of {asin}: {e.stderr}")
+        if not summaries[asin]:
+            return jsonify(error="Full summary not found in API response."), 404
+        return jsonify(success=True, summary=summaries[asin])
+    except AudibleApiError as e:
+        log.error(f"Error calling the Audible API for full summary of {asin}: {e}")
         return jsonify(error="Failed to fetch details from Audible API."), 502
-    except (json.JSONDecodeError, AttributeError):
+    except AttributeError:
         return jsonify(error="Invalid API response from Audible."), 502
     except sqlite3.Error as e:
         log.error(f"Database error updating full summary for {asin}: {e}", exc_info=True)
@@ -1,16 +1,20 @@
 # audible_downloader/scheduler.py
 
 import time
+from datetime import datetime, timedelta
 from threading import Thread
+from zoneinfo import ZoneInfo
 
 from apscheduler.schedulers.background import BackgroundScheduler  # type: ignore
 from apscheduler.triggers.cron import CronTrigger  # type: ignore
 
 from . import app, settings_changed_event
 from .health_check import perform_audible_auth_check
-from .job_manager import start_new_job
+from .job_manager import active_job, start_new_job
+from .library_watcher import apply_library_watcher_setting
 from .logger import log
 from .settings import load_settings
+from .summary_logic import backfill_full_summaries
 
 # --- Create a global scheduler instance ---
 # We initialize it here but will configure its timezone dynamically at startup.
@@ -48,6 +52,11 @@ def _run_audible_auth_check_job():
     log.info("SCHEDULER: Triggering periodic Audible connection check...")
     perform_audible_auth_check()
 
+def _run_summary_backfill_job():
+    log.info("SCHEDULER: Triggering background full summary backfill...")
+    # Low priority: the backfill yields to any sync or download job and resumes on its next run.
+    backfill_full_summaries(should_pause=lambda: active_job["job_id"] is not None)
+
 # --- Main Scheduler Management Function ---
 def _apply_schedules():
     """Contains the core logic to read settings and apply them to the scheduler."""
@@ -115,7 +124,7 @@ def _apply_schedules():
     auth_interval_hours = current_settings["tasks"]["audible_auth_check_interval_hours"]
 
     if auth_job:
-        if str(auth_job.trigger) != f"interval[{auth_interval_hours:02}:00:00]":
+        if auth_job.trigger.interval != timedelta(hours=auth_interval_hours):
             scheduler.reschedule_job("audible_auth_check", trigger="interval", hours=auth_interval_hours)
             log.info(f"SCHEDULER: Rescheduled AUTH check for every {auth_interval_hours} hours.")
     else:
@@ -124,6 +133,39 @@ def _apply_schedules():
         )
         log.info(f"SCHEDULER: Added AUTH check job for every {auth_interval_hours} hours.")
 
+    # --- Summary Backfill Job ---
+    summary_job = scheduler.get_job("summary_backfill")
+    summary_enabled = current_settings["tasks"].get("is_summary_backfill_enabled", True)
+    summary_interval_hours = current_settings["tasks"].get("summary_backfill_interval_hours", 6)
+
+    if summary_enabled:
+        if summary_job:
+            if summary_job.trigger.interval != timedelta(hours=summary_interval_hours):
+                scheduler.reschedule_job(
+                    "summary_backfill", trigger="interval", hours=summary_interval_hours, timezone=tz
+                )
+                log.info(f"SCHEDULER: Rescheduled SUMMARY backfill for every {summary_interval_hours} hours.")
+        else:
+            # The first run comes shortly after startup, so new installs get their summaries soon.
+            scheduler.add_job(
+                _run_summary_backfill_job,
+                "interval",
+                hours=summary_interval_hours,
+                id="summary_backfill",
+                jitter=120,
+                timezone=tz,
+                # An aware time in the scheduler's timezone, so the first run is not offset by the container clock.
+                next_run_time=datetime.now(ZoneInfo(tz)) + timedelta(minutes=5),
+            )
+            log.info(f"SCHEDULER: Added SUMMARY backfill job for every {summary_interval_hours} hours.")
+    elif summary_job:
+        scheduler.remove_job("summary_backfill")
+        log.info("SCHEDULER: Removed SUMMARY backfill job as it is now disabled.")
+
+    # --- Library Watcher ---
+    # Not a scheduled job, but it is switched on and off by the settings in the same way.
+    apply_library_watcher_setting(current_settings)
+
 def scheduler_worker():
     """
     The main worker function that configures and runs the scheduler.
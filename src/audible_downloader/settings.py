@@ -18,16 +18,37 @@ DEFAULT_SETTINGS = {
     "password_hash": generate_password_hash("changeme"),
     "initial_setup_complete": False,
     "advanced_mode_enabled": False,
+    # Bumped when a stored setting needs a one-time migration, see _migrate_settings().
+    "settings_version": 2,
     "job": {
         "download": {
             "max_parallel_downloads": 2,
             "total_processing_cores": 2,
-        }
+        },
+        "sync": {
+            # How many files a DEEP sync probes at the same time when they are not in the scan cache.
+            "scan_workers": 4,
+            # Follow changes to the library with inotify and update book statuses between syncs.
+            "is_library_watcher_enabled": False,
+        },
+    },
+    "library": {
+        # Every directory the library is spread over. All of them are scanned; new books go to one of them.
+        "roots": ["/data"],
+        # Where new books are written: "most_free_space" or "least_load" (fewest books being written).
+        "output_placement": "most_free_space",
     },
     "naming": {"template": "{author}/{title}/{author} - {title}"},
     "conversion": {
         "quality": "High",
-        "is_chunked_conversion_enabled": False,
+        # Encode each book in parallel chunks planned from its chapters, or in one multi-threaded ffmpeg process.
+        "is_chunked_conversion_enabled": True,
+        # Benchmark both encode strategies on this host and use the faster one, overriding the toggle above.
+        "is_auto_encode_strategy_enabled": False,
+        # The preferred length of a chunk. Short chapters are packed and long ones split to reach it.
+        "target_chunk_minutes": 10,
+        # Decrypt the download once into a plain local file before the chapters are encoded from it.
+        "is_decrypt_once_enabled": True,
     },
     "tasks": {
         "timezone": "UTC",
@@ -37,6 +58,10 @@ DEFAULT_SETTINGS = {
         "fast_sync_schedule": {
             "cron": "0 */4 * * *",  # Default: Run every 4 hours.
         },
+        # An incremental fast sync only asks Audible for books purchased since the last one.
+        # A full listing still runs once the last one is older than the interval below.
+        "is_incremental_fast_sync_enabled": True,
+        "full_library_sync_interval_hours": 24,
         # Add a new, separate schedule for the "Deep" (full filesystem scan) sync.
         "is_auto_deep_sync_enabled": False,
         "deep_sync_schedule": {
@@ -46,6 +71,9 @@ DEFAULT_SETTINGS = {
         "process_schedule": {
             "cron": "0 4 * * *",  # Default: Run once a day at 4:00 AM
         },
+        # Fill in the full publisher summaries in the background, a batch of books per request.
+        "is_summary_backfill_enabled": True,
+        "summary_backfill_interval_hours": 6,
         "auto_process_new": True,
         "auto_process_missing": True,
         "auto_process_error": False,
@@ -65,6 +93,24 @@ def deep_update(source, overrides):
     return source
 
 
+def _migrate_settings(loaded_settings):
+    """
+    Applies one-time migrations to settings stored by an older version.
+
+    Returns:
+        bool: True if the stored settings were changed and need to be saved.
+    """
+    version = loaded_settings.get("settings_version", 1)
+    if version >= DEFAULT_SETTINGS["settings_version"]:
+        return False
+    if version < 2:
+        # Saving the settings page stored the old default (off) of chunked conversion in every
+        # install. It now plans chunks by duration and is on by default, so switch it on once.
+        loaded_settings.setdefault("conversion", {})["is_chunked_conversion_enabled"] = True
+    loaded_settings["settings_version"] = DEFAULT_SETTINGS["settings_version"]
+    return True
+
+
 def load_settings():
     """Securely loads settings from settings.json, falling back to defaults."""
     if not os.path.exists(SETTINGS_FILE):
@@ -73,14 +119,17 @@ def load_settings():
         try:
             with open(SETTINGS_FILE) as f:
                 loaded_settings = json.load(f)
+            migrated = _migrate_settings(loaded_settings)
             # Start with defaults and layer the loaded settings on top
             # to ensure all keys are present.
             settings = DEFAULT_SETTINGS.copy()
             deep_update(settings, loaded_settings)
-            return settings
         except (OSError, json.JSONDecodeError) as e:
             print(f"Error loading settings.json: {e}. Using default settings.")
             return DEFAULT_SETTINGS.copy()
+    if migrated:
+        save_settings(settings)
+    return settings
 
 
 def save_settings(settings_dict):
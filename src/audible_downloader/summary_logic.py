@@ -0,0 +1,114 @@
+# audible_downloader/summary_logic.py
+
+import re
+import sqlite3
+import time
+from threading import Lock
+
+from .audible_api import AudibleApiError, get_api_client
+from .db import get_db_connection
+from .logger import log
+
+# --- Full Summary Backfill ---
+# The library listing only carries a shortened 'merchandising_summary'. The full publisher
+# summary comes from the catalog, which accepts many ASINs per request. A low-priority
+# background job fills in the full summaries in batches, so the book detail modal can
+# show them straight from the database.
+
+# The catalog endpoint returns at most this many products per request.
+SUMMARY_BATCH_SIZE = 50
+# Pause between two batches, so the backfill never competes with a sync for the API.
+SUMMARY_BATCH_PAUSE_SEC = 2
+SUMMARY_RESPONSE_GROUPS = "product_desc,product_extended_attrs"
+# is_summary_full values: 0 = shortened, 1 = full, 2 = the catalog has no publisher summary.
+# Books marked 2 keep their shortened summary and are not requested again.
+SUMMARY_UNAVAILABLE = 2
+
+_backfill_lock = Lock()
+
+
+def clean_summary_html(summary_html):
+    """Strips the HTML tags from a publisher summary."""
+    return re.sub("<[^<]+?>", "", summary_html).strip()
+
+
+def fetch_full_summaries(asins):
+    """
+    Fetches the full publisher summaries of up to SUMMARY_BATCH_SIZE books in one catalog request.
+
+    Returns:
+        dict: ASIN mapped to its cleaned summary, or to None if the catalog has none.
+
+    Raises:
+        AudibleApiError: If the request fails.
+    """
+    data = get_api_client().get("/1.0/catalog/products", asins=",".join(asins), response_groups=SUMMARY_RESPONSE_GROUPS)
+    summaries = dict.fromkeys(asins)
+    for product in data.get("products") or []:
+        summary_html = product.get("publisher_summary")
+        if product.get("asin") in summaries and summary_html:
+            summaries[product["asin"]] = clean_summary_html(summary_html) or None
+    return summaries
+
+
+def store_full_summaries(cur, summaries):
+    """Writes the results of fetch_full_summaries() with one executemany() per outcome."""
+    cur.executemany(
+        "UPDATE audiobooks SET summary = ?, is_summary_full = 1 WHERE asin = ?",
+        [(summary, asin) for asin, summary in summaries.items() if summary],
+    )
+    cur.executemany(
+        f"UPDATE audiobooks SET is_summary_full = {SUMMARY_UNAVAILABLE} WHERE asin = ?",
+        [(asin,) for asin, summary in summaries.items() if not summary],
+    )
+
+
+def backfill_full_summaries(should_pause=None):
+    """
+    Fetches the full summary of every book that only has the shortened one.
+
+    Args:
+        should_pause (callable, optional): Checked before every batch. When it returns True
+            the backfill stops early and picks up the remaining books on its next run.
+
+    Returns:
+        int: The number of books whose summary was completed.
+    """
+    if not _backfill_lock.acquire(blocking=False):
+        log.info("SUMMARIES: A summary backfill is already running.")
+        return 0
+    try:
+        with get_db_connection() as con:
+            rows = con.execute(
+                "SELECT asin FROM audiobooks WHERE is_summary_full = 0 OR is_summary_full IS NULL ORDER BY asin"
+            ).fetchall()
+        asins = [row["asin"] for row in rows]
+        if not asins:
+            return 0
+        log.info(f"SUMMARIES: Fetching the full summaries of {len(asins)} book(s).")
+
+        completed = 0
+        for start in range(0, len(asins), SUMMARY_BATCH_SIZE):
+            if should_pause and should_pause():
+                log.info(f"SUMMARIES: Pausing the backfill after {completed} book(s) because a job is running.")
+                break
+            batch = asins[start : start + SUMMARY_BATCH_SIZE]
+            try:
+                summaries = fetch_full_summaries(batch)
+                with get_db_connection() as con:
+                    store_full_summaries(con.cursor(), summaries)
+                    con.commit()
+            except AudibleApiError as e:
+                log.warning(f"SUMMARIES: Stopping the backfill, catalog request failed: {e}")
+                break
+            except sqlite3.Error as e:
+                log.error(f"SUMMARIES: Could not store full summaries: {e}", exc_info=True)
+                break
+            completed += sum(1 for summary in summaries.values() if summary)
+            if start + SUMMARY_BATCH_SIZE < len(asins):
+                time.sleep(SUMMARY_BATCH_PAUSE_SEC)
+
+        log.info(f"SUMMARIES: Backfill finished. Completed the summaries of {completed} of {len(asins)} book(s).")
+        return completed
+    finally:
+        _backfill_lock.release()
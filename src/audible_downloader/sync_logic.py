@@ -1,17 +1,25 @@
 # audible_downloader/sync_logic.py
 
+import hashlib
 import json
+import math
 import os
+import queue
 import sqlite3
 import subprocess
-
-import requests  # type: ignore
-
-from . import DATABASE_DIR
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import UTC, datetime, timedelta
+from threading import Thread
 
 # Import necessary components from our other modules
-from .db import get_db_connection
+from .audible_api import AudibleApiError, get_api_client
+from .cover_logic import CoverPipeline
+from .db import get_db_connection, get_sync_state, set_sync_state
+from .library_roots import get_library_roots, is_path_under, like_path_prefix
 from .logger import log
+from .mp4_reader import Mp4ParseError, read_mp4_info
+from .settings import load_settings
 
 
 # --- Private Helper: Yields progress updates in the correct format ---
@@ -32,234 +40,1020 @@ def _yield_progress(status_text, progress, stage_text=None):
     yield f"EVENT_SYNC_UPDATE:{json.dumps(payload)}"
 
 
+# --- Private Helper: Runs independent phases at the same time ---
+def _run_phases_concurrently(job_id, phases, progress_start, progress_end):
+    """
+    Generator that drives several phase generators in their own threads and merges
+    their progress into one event stream.
+
+    Each phase reports progress on its own scale. The merged event shows the latest
+    status and stage text of every phase, and its progress is the average completion
+    of all phases mapped onto progress_start..progress_end.
+
+    Args:
+        job_id (int): The ID of the current job for logging.
+        phases (list): (name, generator, phase_progress_start, phase_progress_end) tuples.
+        progress_start (int): Overall progress when no phase has started.
+        progress_end (int): Overall progress when every phase has finished.
+
+    Returns:
+        dict: Each phase's return value by name. If a phase raised, the first exception is
+        re-raised once all phases have finished.
+    """
+    events = queue.Queue()
+
+    def run_phase(name, generator):
+        try:
+            while True:
+                try:
+                    line = next(generator)
+                except StopIteration as stop:
+                    events.put(("done", name, stop.value))
+                    return
+                events.put(("event", name, line))
+        except Exception as e:  # Handed to the consuming thread and re-raised there
+            events.put(("error", name, e))
+
+    results = {}
+    fractions = {name: 0.0 for name, *_ in phases}
+    latest = {name: {} for name, *_ in phases}
+    ranges = {name: (start, end) for name, _, start, end in phases}
+    errors = []
+    for name, generator, *_ in phases:
+        Thread(target=run_phase, args=(name, generator), name=f"sync-{name}", daemon=True).start()
+
+    pending = len(phases)
+    while pending:
+        kind, name, value = events.get()
+        if kind == "done":
+            pending -= 1
+            results[name] = value
+            fractions[name] = 1.0
+            continue
+        if kind == "error":
+            pending -= 1
+            log.error(f"SYNC-LOGIC ({job_id}): Phase '{name}' failed: {value}")
+            errors.append(value)
+            continue
+        if not value.startswith("EVENT_SYNC_UPDATE:"):
+            yield value
+            continue
+
+        payload = json.loads(value.split(":", 1)[1])
+        start, end = ranges[name]
+        fractions[name] = min(max((payload["progress"] - start) / (end - start), 0.0), 1.0)
+        latest[name].update({key: payload[key] for key in ("status_text", "stage_text") if key in payload})
+        overall = sum(fractions.values()) / len(fractions)
+        progress = progress_start + int(overall * (progress_end - progress_start))
+        status_text = " | ".join(info["status_text"] for info in latest.values() if "status_text" in info)
+        stage_text = " + ".join(info["stage_text"] for info in latest.values() if "stage_text" in info)
+        yield from _yield_progress(status_text, progress, stage_text=stage_text or None)
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+# --- Library Upsert Engine ---
+# The metadata columns that a sync writes for every book, in the order used by the upsert statement.
+BOOK_COLUMNS = (
+    "author",
+    "title",
+    "series",
+    "narrator",
+    "runtime_min",
+    "release_date",
+    "publisher",
+    "language",
+    "purchase_date",
+    "summary",
+    "date_added",
+)
+
+# A single statement that inserts new books as 'NEW' and updates existing ones in place.
+# The summary guard keeps a full publisher summary that was fetched on demand from being
+# overwritten by the truncated merchandising summary that the library endpoint returns.
+_UPSERT_BOOK_SQL = (
+    f"INSERT INTO audiobooks (asin, status, metadata_hash, {', '.join(BOOK_COLUMNS)}) "
+    f"VALUES (?, 'NEW', ?, {', '.join('?' for _ in BOOK_COLUMNS)}) "
+    "ON CONFLICT(asin) DO UPDATE SET metadata_hash = excluded.metadata_hash, "
+    + ", ".join(f"{col} = excluded.{col}" for col in BOOK_COLUMNS if col != "summary")
+    + ", summary = CASE WHEN audiobooks.is_summary_full = 1 THEN audiobooks.summary ELSE excluded.summary END"
+)
+
+
+def _normalize_library_item(item):
+    """
+    Extracts the database fields from a single item of the Audible library response.
+    Returns a dictionary keyed by 'asin' and BOOK_COLUMNS, or None if the item has no ASIN.
+    """
+    asin = item.get("asin")
+    if not asin:
+        return None
+
+    authors_list = item.get("authors")
+    series_list = item.get("series")
+    narrators_list = item.get("narrators")
+    summary_raw = item.get("merchandising_summary") or ""
+    summary = summary_raw.replace("</p>", "\n").replace("<p>", "").replace("<br />", "\n").strip()
+
+    return {
+        "asin": asin,
+        "author": authors_list[0].get("name", "N/A") if authors_list else "N/A",
+        "title": item.get("title", "N/A"),
+        "series": series_list[0].get("title", "N/A") if series_list else "N/A",
+        "narrator": narrators_list[0].get("name", "N/A") if narrators_list else "N/A",
+        "runtime_min": item.get("runtime_length_min", 0),
+        "release_date": item.get("release_date", "N/A"),
+        "publisher": item.get("publisher_name", "N/A"),
+        "language": item.get("language", "N/A"),
+        "purchase_date": item.get("purchase_date", "N/A"),
+        "summary": summary or "N/A",
+        "date_added": (item.get("library_status") or {}).get("date_added", "N/A"),
+    }
+
+
+def _metadata_fingerprint(book_row):
+    """Returns a stable hash of the normalized metadata fields of a book row."""
+    values = [book_row[col] for col in BOOK_COLUMNS]
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _diff_library(known_hashes, book_rows):
+    """
+    Compares freshly normalized book rows against the fingerprints already stored in the DB.
+
+    Args:
+        known_hashes (dict): Maps each ASIN in the DB to its stored metadata_hash (None if never hashed).
+        book_rows (list): Dictionaries as returned by _normalize_library_item.
+
+    Returns:
+        tuple: (rows_to_write, diff) where rows_to_write only contains added or changed books
+               and diff is a dict of 'added', 'changed' and 'unchanged' ASIN lists.
+    """
+    rows_to_write = []
+    diff = {"added": [], "changed": [], "unchanged": []}
+    for row in book_rows:
+        asin = row["asin"]
+        row["metadata_hash"] = _metadata_fingerprint(row)
+        if asin not in known_hashes:
+            diff["added"].append(asin)
+        elif known_hashes[asin] != row["metadata_hash"]:
+            diff["changed"].append(asin)
+        else:
+            diff["unchanged"].append(asin)
+            continue
+        # Remember the new fingerprint so a duplicate listing of the same ASIN is not written twice.
+        known_hashes[asin] = row["metadata_hash"]
+        rows_to_write.append(row)
+    return rows_to_write, diff
+
+
+def _upsert_books(cur, book_rows):
+    """
+    Writes a batch of fingerprinted book rows with a single executemany() upsert.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor of the open sync transaction.
+        book_rows (list): Dictionaries as returned by _diff_library.
+    """
+    if not book_rows:
+        return
+    cur.executemany(
+        _UPSERT_BOOK_SQL,
+        [(row["asin"], row["metadata_hash"]) + tuple(row[col] for col in BOOK_COLUMNS) for row in book_rows],
+    )
+
+
+# --- Library Page Fetching ---
+LIBRARY_PAGE_SIZE = 1000
+LIBRARY_RESPONSE_GROUPS = "media,contributors,series,product_attrs,product_desc"
+# Once the first page reveals the library size, this many pages are fetched at once.
+LIBRARY_FETCH_WORKERS = 4
+# How often a single failed page is retried before the sync gives up.
+LIBRARY_PAGE_ATTEMPTS = 3
+
+
+def _fetch_library_page(page, purchased_after=None):
+    """
+    Fetches a single page of the Audible library, optionally only books purchased after a timestamp.
+
+    Returns:
+        tuple: (items, total_count) where total_count is the library size reported
+               in the 'Total-Count' response header, or None if it is missing.
+    """
+    params = {"num_results": LIBRARY_PAGE_SIZE, "page": page, "response_groups": LIBRARY_RESPONSE_GROUPS}
+    if purchased_after:
+        params["purchased_after"] = purchased_after
+    response = get_api_client().get_response("/1.0/library", **params)
+    total_count = response.headers.get("Total-Count", "")
+    return response.json().get("items", []), int(total_count) if total_count.isdigit() else None
+
+
+def _fetch_library_page_with_retry(page, purchased_after=None):
+    """Fetches a library page, retrying transient failures so one bad page does not restart the whole sync."""
+    for attempt in range(1, LIBRARY_PAGE_ATTEMPTS + 1):
+        try:
+            return _fetch_library_page(page, purchased_after)
+        except (AudibleApiError, ValueError) as e:
+            # Client errors such as an expired login will not fix themselves, so only retry
+            # timeouts, throttling, server errors and connection problems.
+            status_code = getattr(e, "status_code", None)
+            is_transient = status_code is None or status_code == 429 or status_code >= 500
+            if not is_transient or attempt == LIBRARY_PAGE_ATTEMPTS:
+                raise
+            log.warning(f"SYNC-LOGIC: Library page {page} failed (attempt {attempt}), retrying: {e}")
+            time.sleep(2**attempt)
+
+
+def _iter_library_pages(purchased_after=None):
+    """
+    Generator that yields (page_number, items, total_count) for every page of the library, in page order.
+
+    The first page is fetched on its own to learn the library size. The remaining
+    pages are then fetched concurrently by a bounded pool while the caller processes
+    earlier pages, with at most a few pages held in memory at any time.
+    If the size is not reported, the next page is prefetched one at a time instead.
+    """
+    items, total_count = _fetch_library_page_with_retry(1, purchased_after)
+    if not items:
+        return
+    yield 1, items, total_count
+    if len(items) < LIBRARY_PAGE_SIZE:
+        return
+
+    if total_count is not None:
+        last_page = math.ceil(total_count / LIBRARY_PAGE_SIZE)
+        with ThreadPoolExecutor(max_workers=LIBRARY_FETCH_WORKERS) as fetcher:
+            pending = {}
+            next_to_submit = 2
+            for page in range(2, last_page + 1):
+                # Keep a bounded window of pages in flight ahead of the one being processed.
+                while next_to_submit <= last_page and len(pending) <= LIBRARY_FETCH_WORKERS:
+                    pending[next_to_submit] = fetcher.submit(
+                        _fetch_library_page_with_retry, next_to_submit, purchased_after
+                    )
+                    next_to_submit += 1
+                items, _ = pending.pop(page).result()
+                if items:
+                    yield page, items, total_count
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        page = 2
+        pending = prefetcher.submit(_fetch_library_page_with_retry, page, purchased_after)
+        while True:
+            items, _ = pending.result()
+            if not items:
+                return
+            # A short page is the last one, so there is nothing left to prefetch.
+            is_last_page = len(items) < LIBRARY_PAGE_SIZE
+            if not is_last_page:
+                pending = prefetcher.submit(_fetch_library_page_with_retry, page + 1, purchased_after)
+            yield page, items, None
+            if is_last_page:
+                return
+            page += 1
+
+
+# --- Incremental Sync Watermark ---
+# sync_state keys for the newest purchase date seen and the time of the last full listing.
+SYNC_STATE_PURCHASE_WATERMARK = "library_purchase_watermark"
+SYNC_STATE_LAST_FULL_SYNC = "last_full_library_sync"
+# Incremental requests reach back this far before the watermark, so books that are
+# added to the library with a slightly earlier purchase date are not missed.
+WATERMARK_OVERLAP = timedelta(days=1)
+
+
+def _get_incremental_start(job_id):
+    """
+    Decides whether a FAST sync can be incremental.
+
+    Returns:
+        str: The 'purchased_after' timestamp to request, or None if a full listing is due.
+    """
+    tasks_settings = load_settings().get("tasks", {})
+    if not tasks_settings.get("is_incremental_fast_sync_enabled", True):
+        return None
+
+    with get_db_connection() as con:
+        watermark = get_sync_state(con, SYNC_STATE_PURCHASE_WATERMARK)
+        last_full_sync = get_sync_state(con, SYNC_STATE_LAST_FULL_SYNC)
+    if not watermark or not last_full_sync:
+        return None
+
+    try:
+        full_sync_interval = timedelta(hours=tasks_settings.get("full_library_sync_interval_hours", 24))
+        if datetime.now(UTC) - datetime.fromisoformat(last_full_sync) >= full_sync_interval:
+            log.info(f"SYNC-LOGIC ({job_id}): Last full listing is older than {full_sync_interval}. Running full.")
+            return None
+        start = datetime.fromisoformat(watermark) - WATERMARK_OVERLAP
+    except ValueError as e:
+        log.warning(f"SYNC-LOGIC ({job_id}): Ignoring unreadable sync watermark: {e}")
+        return None
+    return start.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
 # --- Private Helper 1: Fetch and update books from Audible API ---
-def _fetch_and_update_from_audible(job_id, sync_mode="DEEP"):
+def _fetch_and_update_from_audible(job_id, sync_mode="DEEP", purchased_after=None):
     """
-    Generator that fetches the full library from Audible's API,
-    processes covers, and inserts/updates book records in the database.
-    Yields progress updates and returns the total number of books found.
+    Generator that streams the library from Audible's API page by page (fetching
+    pages concurrently once the library size is known), processes covers, and
+    inserts/updates book records in the database.
+    Each page is committed and dropped before the next one is processed, so
+    memory use does not grow with the library size.
+    Only books whose metadata fingerprint changed are written. If purchased_after is
+    given, only books purchased since then are requested (an incremental sync).
+    On success the purchase watermark is advanced in the sync_state table.
+    Yields progress updates and returns a dict of 'added', 'changed' and 'unchanged' ASIN lists.
     """
     # --- START: MODIFICATION ---
     # The stage text and progress calculations now depend on the sync mode.
     stage_text = "Phase 1/1: Fetching from Audible" if sync_mode == "FAST" else "Phase 1/3: Fetching from Audible"
     yield from _yield_progress("Fetching library from Audible...", 5, stage_text=stage_text)
+    # Progress range is adjusted based on whether this is the only step or the first of three.
+    # The metadata stage is followed by the cover stage, which gets the remaining share.
+    progress_range = 65 if sync_mode == "FAST" else 30
+    cover_progress_range = 25 if sync_mode == "FAST" else 10
     # --- END: MODIFICATION ---
 
-    all_items = []
-    page = 1
-    page_size = 1000
+    # Covers download in the background while metadata keeps landing in the DB page by page.
+    covers = CoverPipeline(job_id)
+    # close() also runs when the upsert fails or the caller abandons this generator,
+    # so the cover workers and session never outlive the sync.
+    try:
+        library_diff = {"added": [], "changed": [], "unchanged": []}
+        items_processed = 0
+        newest_purchase_date = ""
+
+        with get_db_connection() as con:
+            cur = con.cursor()
+            hash_rows = cur.execute("SELECT asin, metadata_hash FROM audiobooks").fetchall()
+            known_hashes = {r["asin"]: r["metadata_hash"] for r in hash_rows}
+            # Until the first page reports the library size, the current DB size
+            # serves as the expected total for the progress bar.
+            expected_total = max(len(known_hashes), 1)
+
+            try:
+                for page, items, total_count in _iter_library_pages(purchased_after):
+                    if total_count:
+                        expected_total = total_count
+                    book_rows = []
+                    for item in items:
+                        items_processed += 1
+                        progress = 5 + int(min(items_processed / expected_total, 1) * progress_range)
+                        if items_processed % 5 == 0:
+                            status_text = f"Processing book {items_processed} (page {page})"
+                            yield from _yield_progress(status_text, progress, stage_text=stage_text)
+
+                        book_row = _normalize_library_item(item)
+                        if not book_row:
+                            continue
+                        covers.submit(book_row["asin"], (item.get("product_images") or {}).get("500"))
+                        book_rows.append(book_row)
+                        # ISO-8601 timestamps in the same format compare correctly as strings.
+                        if book_row["purchase_date"] != "N/A":
+                            newest_purchase_date = max(newest_purchase_date, book_row["purchase_date"])
+
+                    # Only books whose fingerprint changed are written.
+                    rows_to_write, page_diff = _diff_library(known_hashes, book_rows)
+                    _upsert_books(cur, rows_to_write)
+                    con.commit()
+                    for key, asins in page_diff.items():
+                        library_diff[key].extend(asins)
+
+                    status_text = f"Committed page {page} ({items_processed} books so far)"
+                    yield from _yield_progress(status_text, progress, stage_text=stage_text)
+            except (AudibleApiError, ValueError, KeyError) as e:
+                log.error(f"SYNC-LOGIC ({job_id}): API fetch failed: {e}")
+                yield from _yield_progress("Error: API fetch failed", 100)
+                raise RuntimeError("Could not fetch library from Audible API.")
+
+            # The whole listing was committed, so it is now safe to advance the watermark.
+            previous_watermark = get_sync_state(con, SYNC_STATE_PURCHASE_WATERMARK, "")
+            if newest_purchase_date > previous_watermark:
+                set_sync_state(con, SYNC_STATE_PURCHASE_WATERMARK, newest_purchase_date)
+            if not purchased_after:
+                set_sync_state(con, SYNC_STATE_LAST_FULL_SYNC, datetime.now(UTC).isoformat())
+            con.commit()
+
+        # All metadata is committed. Now wait for the cover stage to finish.
+        cover_stage_text = "Phase 1/1: Downloading Covers" if sync_mode == "FAST" else "Phase 1/3: Downloading Covers"
+        cover_progress_start = 5 + progress_range
+        for completed, total in covers.drain():
+            progress = cover_progress_start + int((completed / total if total else 1) * cover_progress_range)
+            status_text = f"Downloading covers ({completed}/{total})"
+            yield from _yield_progress(status_text, progress, stage_text=cover_stage_text)
+
+        log.info(
+            f"SYNC-LOGIC ({job_id}): Processed {items_processed} total books from library. "
+            f"Found {len(library_diff['added'])} new. Updated {len(library_diff['changed'])} changed. "
+            f"Skipped {len(library_diff['unchanged'])} unchanged."
+        )
+        return library_diff
+    finally:
+        covers.close()
+
+
+# --- Targeted Sync ---
+# A TARGETED sync refreshes only part of the library instead of all of it. Its job_params may hold:
+#   "asins": ASINs to re-fetch from Audible and whose known files are re-checked on disk,
+#   "purchased_after" / "purchased_before": an ISO-8601 purchase date window to re-fetch,
+#   "path": a directory to re-scan, either absolute or relative to the library roots.
+AUDIBLE_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
+
+
+def _parse_timestamp(value, name):
+    """Parses an ISO-8601 date or timestamp from job_params into an aware UTC datetime."""
+    try:
+        timestamp = datetime.fromisoformat(str(value))
+    except ValueError as e:
+        raise ValueError(f"'{name}' is not an ISO-8601 date: {value}") from e
+    return timestamp.replace(tzinfo=timestamp.tzinfo or UTC).astimezone(UTC)
+
+
+def parse_sync_target(job_params, settings=None):
+    """
+    Validates the job_params of a TARGETED sync.
+
+    Returns:
+        dict: 'asins' (list), 'purchased_after' and 'purchased_before' (datetime or None),
+        and 'scan_dirs' (list of absolute directories below the library roots).
+
+    Raises:
+        ValueError: If the parameters are malformed or select nothing.
+    """
+    asins = job_params.get("asins") or []
+    if isinstance(asins, str):
+        asins = asins.replace(",", " ").split()
+    if not isinstance(asins, list) or not all(isinstance(asin, str) for asin in asins):
+        raise ValueError("'asins' must be a list of ASIN strings.")
+    asins = list(dict.fromkeys(asin.strip() for asin in asins if asin.strip()))
+
+    purchased_after, purchased_before = job_params.get("purchased_after"), job_params.get("purchased_before")
+    if purchased_before and not purchased_after:
+        raise ValueError("'purchased_before' requires 'purchased_after'.")
+    purchased_after = _parse_timestamp(purchased_after, "purchased_after") if purchased_after else None
+    purchased_before = _parse_timestamp(purchased_before, "purchased_before") if purchased_before else None
+    if purchased_after and purchased_before and purchased_before < purchased_after:
+        raise ValueError("'purchased_before' is earlier than 'purchased_after'.")
+
+    scan_dirs = []
+    path = str(job_params.get("path") or "").strip()
+    if path:
+        roots = get_library_roots(settings)
+        candidates = [path] if os.path.isabs(path) else [os.path.join(root, path) for root in roots]
+        # normpath resolves '..', so a relative path cannot reach outside its root.
+        candidates = [os.path.normpath(candidate) for candidate in candidates]
+        scan_dirs = [d for d in candidates if any(is_path_under(d, root) for root in roots)]
+        if not scan_dirs:
+            raise ValueError(f"'path' is not inside a library root: {path}")
+
+    if not asins and not purchased_after and not scan_dirs:
+        raise ValueError("A targeted sync needs 'asins', 'purchased_after' or 'path'.")
+    return {
+        "asins": asins,
+        "purchased_after": purchased_after,
+        "purchased_before": purchased_before,
+        "scan_dirs": scan_dirs,
+    }
+
+
+def _fetch_library_item(asin):
+    """Fetches a single book of the library, or returns None if it is not in the library."""
+    try:
+        data = get_api_client().get(f"/1.0/library/{asin}", response_groups=LIBRARY_RESPONSE_GROUPS)
+    except AudibleApiError as e:
+        if getattr(e, "status_code", None) in (400, 404):
+            log.warning(f"SYNC-LOGIC: ASIN {asin} is not in the Audible library: {e}")
+            return None
+        raise
+    return data.get("item")
+
+
+def _fetch_and_update_targeted(job_id, target):
+    """
+    Generator that re-fetches only the selected books from Audible: the given ASINs one
+    request each (several at a time), and the purchase date window through the library
+    listing's purchased_after filter. The books are written and their covers downloaded
+    like in a full fetch, but the incremental sync watermark is left alone.
+    Yields progress updates and returns a dict of 'added', 'changed' and 'unchanged' ASIN lists.
+    """
+    stage_text = "Phase 1/3: Fetching from Audible"
+    yield from _yield_progress("Fetching selected books from Audible...", 5, stage_text=stage_text)
+
+    items = []
+    try:
+        if target["asins"]:
+            with ThreadPoolExecutor(max_workers=LIBRARY_FETCH_WORKERS) as fetcher:
+                items += [item for item in fetcher.map(_fetch_library_item, target["asins"]) if item]
+        if target["purchased_after"]:
+            purchased_after = target["purchased_after"].strftime(AUDIBLE_TIMESTAMP_FORMAT)
+            purchased_before = target["purchased_before"]
+            for _, page_items, _ in _iter_library_pages(purchased_after):
+                for item in page_items:
+                    purchase_date = item.get("purchase_date")
+                    if purchased_before and purchase_date:
+                        if _parse_timestamp(purchase_date, "purchase_date") > purchased_before:
+                            continue
+                    items.append(item)
+    except (AudibleApiError, ValueError, KeyError) as e:
+        log.error(f"SYNC-LOGIC ({job_id}): API fetch failed: {e}")
+        yield from _yield_progress("Error: API fetch failed", 100)
+        raise RuntimeError("Could not fetch the selected books from Audible API.")
+
+    yield from _yield_progress(f"Updating {len(items)} book(s)...", 30, stage_text=stage_text)
+    covers = CoverPipeline(job_id)
+    try:
+        book_rows = []
+        for item in items:
+            book_row = _normalize_library_item(item)
+            if book_row:
+                covers.submit(book_row["asin"], (item.get("product_images") or {}).get("500"))
+                book_rows.append(book_row)
+
+        with get_db_connection() as con:
+            cur = con.cursor()
+            hash_rows = cur.execute("SELECT asin, metadata_hash FROM audiobooks").fetchall()
+            known_hashes = {r["asin"]: r["metadata_hash"] for r in hash_rows}
+            rows_to_write, library_diff = _diff_library(known_hashes, book_rows)
+            _upsert_books(cur, rows_to_write)
+            con.commit()
 
-    while True:
+        for completed, total in covers.drain():
+            progress = 35 + int((completed / total if total else 1) * 10)
+            status_text = f"Downloading covers ({completed}/{total})"
+            yield from _yield_progress(status_text, progress, stage_text="Phase 1/3: Downloading Covers")
+    finally:
+        covers.close()
+
+    log.info(
+        f"SYNC-LOGIC ({job_id}): Refreshed {len(book_rows)} selected book(s). "
+        f"Found {len(library_diff['added'])} new. Updated {len(library_diff['changed'])} changed. "
+        f"Skipped {len(library_diff['unchanged'])} unchanged."
+    )
+    return library_diff
+
+
+# --- Private Helper 2: Scan the local filesystem for .m4b files ---
+# Cache misses are probed by this many workers at once unless the settings say otherwise.
+DEFAULT_SCAN_WORKERS = 4
+# The columns kept per file in the file_scan_cache table, besides the filepath primary key.
+SCAN_CACHE_COLUMNS = ("dirpath", "size", "mtime_ns", "inode", "asin", "duration", "bit_rate", "chapter_count")
+# The text cache used before file_scan_cache. It is removed after the first scan with the new cache.
+LEGACY_SCAN_CACHE_FILE = "/config/.file_scan_cache"
+
+
+def _walk_library(cur, root):
+    """
+    Walks the library below root and collects the audiobook files the scan has to look at.
+
+    A directory's mtime only changes when entries are added, removed or renamed in it, so
+    for a directory whose mtime is unchanged since the last scan the file list is taken
+    from file_scan_cache instead of listing and stat'ing its files again. Its subdirectories
+    are still stat'ed, because a change deeper in the tree does not update the mtime of the
+    directories above it. Like os.walk, symlinked directories are not followed.
+
+    Returns:
+        tuple: (listed_files, reused_files, dir_updates, visited_dirs). listed_files holds
+        (filepath, stat) for the files of changed directories, reused_files holds
+        (filepath, asin) for the files of unchanged ones, and dir_updates maps each
+        re-listed directory to its new dir_scan_cache row.
+    """
+    listed_files, reused_files, dir_updates, visited_dirs = [], [], {}, []
+    pending_dirs = [root]
+    while pending_dirs:
+        directory = pending_dirs.pop()
         try:
-            endpoint = (
-                f"/1.0/library?num_results={page_size}&page={page}"
-                f"&response_groups=media,contributors,series,product_attrs,product_desc"
-            )
-            command = ["audible", "api", endpoint]
-            env = os.environ.copy()
-            env["HOME"] = DATABASE_DIR
-            result = subprocess.run(command, capture_output=True, text=True, check=True, encoding="utf-8", env=env)
-            response = json.loads(result.stdout)
-            items_on_page = response.get("items", [])
-            if not items_on_page:
-                break
-            all_items.extend(items_on_page)
-            page += 1
-        except (subprocess.CalledProcessError, json.JSONDecodeError, KeyError) as e:
-            log.error(f"SYNC-LOGIC ({job_id}): API fetch failed: {e}")
-            yield from _yield_progress("Error: API fetch failed", 100)
-            raise RuntimeError("Could not fetch library from Audible API.")
+            # Taken before listing, so a change made while we list shows up as a new mtime next time.
+            dir_mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError as e:
+            log.warning(f"SYNC-LOGIC: Could not stat directory '{directory}': {e}")
+            continue
+        visited_dirs.append(directory)
+
+        cached = cur.execute("SELECT mtime_ns, subdirs FROM dir_scan_cache WHERE dirpath = ?", (directory,)).fetchone()
+        if cached and cached["mtime_ns"] == dir_mtime_ns:
+            pending_dirs.extend(json.loads(cached["subdirs"]))
+            rows = cur.execute("SELECT filepath, asin FROM file_scan_cache WHERE dirpath = ?", (directory,)).fetchall()
+            reused_files += [(row["filepath"], row["asin"]) for row in rows]
+            continue
+
+        subdirs = []
+        listing_complete = True
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name.endswith(".m4b"):
+                            listed_files.append((entry.path, entry.stat()))
+                    except OSError as e:
+                        listing_complete = False
+                        log.warning(f"SYNC-LOGIC: Could not stat '{entry.path}': {e}")
+        except OSError as e:
+            log.warning(f"SYNC-LOGIC: Could not list directory '{directory}': {e}")
+            continue
+        pending_dirs.extend(subdirs)
+        # An incomplete listing is not cached, so the directory is listed again next time.
+        if listing_complete:
+            dir_updates[directory] = (directory, dir_mtime_ns, json.dumps(subdirs))
+    return listed_files, reused_files, dir_updates, visited_dirs
+
+
+def _walk_library_roots(roots):
+    """
+    Walks every library root (or directory below one) in its own thread, so roots on
+    different disks are listed in parallel.
+
+    Returns:
+        dict: Each root mapped to its _walk_library() result, in the order of roots.
+    """
+
+    def walk(root):
+        # sqlite3 connections cannot be shared between threads, so every walker reads through its own.
+        con = get_db_connection()
+        try:
+            return _walk_library(con.cursor(), root)
+        finally:
+            con.close()
+
+    if not roots:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(roots), thread_name_prefix="walk") as executor:
+        return dict(zip(roots, executor.map(walk, roots), strict=True))
+
+
+def probe_audiobook_file(filepath, size):
+    """
+    Reads the ASIN tag, duration, bit rate and chapter count of an audiobook file.
+    The metadata is read in-process from the MP4 box structure; ffprobe is only
+    started for files the reader cannot handle.
+
+    Returns:
+        dict: The probe results, keyed like the file_scan_cache columns.
+    """
+    try:
+        info = read_mp4_info(filepath)
+        if info["asin"]:
+            # ffprobe reports the container bit rate the same way: total size over duration.
+            info["bit_rate"] = int(size * 8 / info["duration"]) if info["duration"] else None
+            return info
+    except (Mp4ParseError, OSError) as e:
+        log.debug(f"SYNC-LOGIC: MP4 reader could not parse '{filepath}', falling back to ffprobe: {e}")
+    ffprobe_cmd = [
+        "ffprobe",
+        "-v",
+        "quiet",
+        "-show_entries",
+        "format=duration,bit_rate:format_tags",
+        "-show_chapters",
+        "-of",
+        "json",
+        filepath,
+    ]
+    result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, check=True)
+    probe = json.loads(result.stdout or "{}")
+    file_format = probe.get("format", {})
+    tags = {key.lower(): value for key, value in file_format.get("tags", {}).items()}
+    return {
+        "asin": tags.get("asin", "").strip() or None,
+        "duration": float(file_format["duration"]) if file_format.get("duration") else None,
+        "bit_rate": int(file_format["bit_rate"]) if file_format.get("bit_rate") else None,
+        "chapter_count": len(probe.get("chapters", [])),
+    }
+
+
+def scan_cache_row(filepath, stat, probe):
+    """Builds a file_scan_cache row (filepath followed by SCAN_CACHE_COLUMNS) from a stat and probe results."""
+    return (filepath, os.path.dirname(filepath), stat.st_size, stat.st_mtime_ns, stat.st_ino) + tuple(
+        probe.get(col) for col in SCAN_CACHE_COLUMNS[4:]
+    )
+
+
+def upsert_scan_cache(cur, rows):
+    """Writes file_scan_cache rows built by scan_cache_row() with a single executemany() upsert."""
+    columns = ", ".join(SCAN_CACHE_COLUMNS)
+    assignments = ", ".join(f"{col} = excluded.{col}" for col in SCAN_CACHE_COLUMNS)
+    cur.executemany(
+        f"INSERT INTO file_scan_cache (filepath, {columns}) "
+        f"VALUES (?, {', '.join('?' for _ in SCAN_CACHE_COLUMNS)}) "
+        f"ON CONFLICT(filepath) DO UPDATE SET {assignments}",
+        rows,
+    )
+
+
+def _lookup_scan_cache(cur, filepath, stat, root):
+    """
+    Finds the cached probe results for a file, or None if it has to be probed.
+    A file is unchanged when its path, size and mtime match. A renamed or moved
+    file is recognised by its inode, size and mtime, so it is not probed again.
+    Inode numbers are only unique per filesystem, so that match is limited to the
+    file's own library root.
+
+    Returns:
+        tuple: (row, moved) where row is the cache row (or None) and moved is True if it was matched by inode.
+    """
+    row = cur.execute("SELECT * FROM file_scan_cache WHERE filepath = ?", (filepath,)).fetchone()
+    if row and row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+        return row, False
+    row = cur.execute(
+        "SELECT * FROM file_scan_cache WHERE inode = ? AND size = ? AND mtime_ns = ? AND filepath LIKE ? ESCAPE '\\'",
+        (stat.st_ino, stat.st_size, stat.st_mtime_ns, like_path_prefix(root)),
+    ).fetchone()
+    return row, row is not None
+
+
+def _scan_local_filesystem(job_id, scan_dirs=None):
+    """
+    Generator that scans every library root for .m4b files, using the
+    dir_scan_cache and file_scan_cache tables to speed up the process.
+    Each root is walked by its own thread, unchanged directories are not
+    listed again, files missing from the cache are probed in parallel, and
+    only new, changed and vanished entries are written back. A root that is
+    not mounted is skipped and keeps its cache rows, so its books are not
+    marked as missing. Yields progress updates and returns a dictionary
+    mapping ASINs to file paths.
+
+    If scan_dirs is given, only those directories (each below a library root)
+    are scanned, and only cache rows below them can be dropped as vanished.
+    """
+    yield from _yield_progress("Scanning local files...", 50, stage_text="Phase 2/3: Scanning Filesystem")
+
+    found_files = {}
+    cache_updates = []
+    files_processed, cache_hits, files_moved = 0, 0, 0
+
+    def record(filepath, stat, probe):
+        if probe["asin"]:
+            found_files[probe["asin"]] = filepath
+        cache_updates.append(scan_cache_row(filepath, stat, probe))
+
+    def progress_update():
+        # This is phase 2/3, so progress goes from 50% to 95%
+        progress = 50 + int((files_processed / total_files_to_scan) * 45) if total_files_to_scan else 95
+        status_text = f"Scanning local files... ({files_processed}/{total_files_to_scan})"
+        return _yield_progress(status_text, progress, stage_text="Phase 2/3: Scanning Filesystem")
 
-    total_books = len(all_items)
-    log.info(f"SYNC-LOGIC ({job_id}): Processing {total_books} total books from library.")
-    CONFIG_DIR = "/config"
-    COVERS_DIR = os.path.join(CONFIG_DIR, "covers")
-    os.makedirs(COVERS_DIR, exist_ok=True)
+    settings = load_settings()
+    roots = get_library_roots(settings)
+    # Each directory to walk, mapped to the library root it belongs to.
+    if scan_dirs is None:
+        scopes = {root: root for root in roots}
+    else:
+        scopes = {d: root for d in scan_dirs for root in roots if is_path_under(d, root)}
+    offline_roots = [root for root in dict.fromkeys(scopes.values()) if not os.path.isdir(root)]
+    for root in offline_roots:
+        log.warning(
+            f"SYNC-LOGIC ({job_id}): Library root '{root}' is not available. Skipping it and keeping its cached files."
+        )
+    online_scopes = [scope for scope, root in scopes.items() if root not in offline_roots]
+
+    files_to_scan, reused_files, dir_updates, visited_dirs = [], [], {}, []
+    file_roots = {}
+    for scope, walk in _walk_library_roots(online_scopes).items():
+        listed, reused, dirs, visited = walk
+        files_to_scan += listed
+        reused_files += reused
+        dir_updates.update(dirs)
+        visited_dirs += visited
+        file_roots.update((filepath, scopes[scope]) for filepath, _ in listed)
+    total_files_to_scan = len(files_to_scan) + len(reused_files)
+    log.info(f"SYNC-LOGIC ({job_id}): Walked {len(online_scopes)} folder(s), found {total_files_to_scan} file(s).")
 
     with get_db_connection() as con:
         cur = con.cursor()
-        new_from_audible, updated_in_db, items_processed = 0, 0, 0
-        for item in all_items:
-            items_processed += 1
-            # --- START: MODIFICATION ---
-            # Progress range is adjusted based on whether this is the only step or the first of three.
-            progress_range = 90 if sync_mode == "FAST" else 40
-            progress = 5 + int((items_processed / total_books) * progress_range)
-            if items_processed % 5 == 0 or items_processed == total_books:
-                status_text = f"Processing book {items_processed}/{total_books}"
-                yield from _yield_progress(status_text, progress, stage_text=stage_text)
-            # --- END: MODIFICATION ---
-
-            asin = item.get("asin")
-            if not asin:
+
+        # Files of unchanged directories come straight from the cache.
+        for filepath, asin in reused_files:
+            if asin:
+                found_files[asin] = filepath
+        cache_hits = len(reused_files)
+
+        # Cache hits are resolved right away with an indexed lookup; only the misses need probing.
+        cache_misses = []
+        for filepath, stat in files_to_scan:
+            row, moved = _lookup_scan_cache(cur, filepath, stat, file_roots[filepath])
+            if row is None:
+                cache_misses.append((filepath, stat))
                 continue
+            cache_hits += 1
+            if moved:
+                # Store the row under the new path; the old path is dropped below if it is gone.
+                files_moved += 1
+                record(filepath, stat, dict(row))
+            elif row["asin"]:
+                found_files[row["asin"]] = filepath
+        files_processed = cache_hits
 
-            cover_url = item.get("product_images", {}).get("500")
-            original_cover_path = os.path.join(COVERS_DIR, f"{asin}_original.jpg")
-            thumb_cover_path = os.path.join(COVERS_DIR, f"{asin}_thumb.jpg")
-            if not os.path.exists(thumb_cover_path) and cover_url:
-                try:
-                    response = requests.get(cover_url, stream=True)
-                    response.raise_for_status()
-                    with open(original_cover_path, "wb") as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    # Ruff E501: Break long command list into multiple lines
-                    ffmpeg_command = [
-                        "ffmpeg", "-y", "-i", original_cover_path,
-                        "-vf", "scale=200:200", thumb_cover_path
-                    ]
-                    subprocess.run(ffmpeg_command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-                except (requests.exceptions.RequestException, subprocess.CalledProcessError) as e:
-                    log.warning(f"SYNC-LOGIC ({job_id}): Could not process cover for {asin}: {e}")
-
-            title = item.get("title", "N/A")
-            authors_list = item.get("authors")
-            author = authors_list[0].get("name", "N/A") if authors_list else "N/A"
-            series_list = item.get("series")
-            series = series_list[0].get("title", "N/A") if series_list else "N/A"
-            narrators_list = item.get("narrators")
-            narrator = narrators_list[0].get("name", "N/A") if narrators_list else "N/A"
-            runtime_min, release_date, publisher, language, purchase_date = (
-                item.get("runtime_length_min", 0),
-                item.get("release_date", "N/A"),
-                item.get("publisher_name", "N/A"),
-                item.get("language", "N/A"),
-                item.get("purchase_date", "N/A"),
+        yield from progress_update()
+
+        if cache_misses:
+            scan_workers = settings.get("job", {}).get("sync", {}).get("scan_workers", DEFAULT_SCAN_WORKERS)
+            scan_workers = max(1, int(scan_workers))
+            log.info(
+                f"SYNC-LOGIC ({job_id}): Probing {len(cache_misses)} uncached file(s) with {scan_workers} worker(s)."
             )
-            summary_raw = item.get("merchandising_summary") or ""
-            summary = summary_raw.replace("</p>", "\n").replace("<p>", "").replace("<br />", "\n").strip()
-            if not summary:
-                summary = "N/A"
-            date_added = item.get("library_status", {}).get("date_added", "N/A")
-
-            cur.execute("SELECT COUNT(*) FROM audiobooks WHERE asin = ?", (asin,))
-            exists = cur.fetchone()[0]
-            if exists == 0:
-                new_from_audible += 1
+            executor = ThreadPoolExecutor(max_workers=scan_workers, thread_name_prefix="scan")
+            try:
+                futures = {}
+                for filepath, stat in cache_misses:
+                    futures[executor.submit(probe_audiobook_file, filepath, stat.st_size)] = (filepath, stat)
+                for future in as_completed(futures):
+                    filepath, stat = futures[future]
+                    files_processed += 1
+                    try:
+                        record(filepath, stat, future.result())
+                    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+                        log.warning(f"SYNC-LOGIC ({job_id}): Could not process file '{filepath}': {e}")
+                        # Keep the directory out of the cache so the file is retried on the next scan.
+                        dir_updates.pop(os.path.dirname(filepath), None)
+                    if files_processed % 5 == 0 or files_processed == total_files_to_scan:
+                        yield from progress_update()
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        # Write back only what changed: new/changed/moved files, then the rows of files that are gone.
+        upsert_scan_cache(cur, cache_updates)
+        cur.execute("CREATE TEMP TABLE scanned_files (filepath TEXT PRIMARY KEY)")
+        cur.executemany(
+            "INSERT OR IGNORE INTO scanned_files (filepath) VALUES (?)",
+            [(path,) for path, _ in files_to_scan] + [(path,) for path, _ in reused_files],
+        )
+        if scan_dirs is None:
+            for root in offline_roots:
                 cur.execute(
-                    (
-                        "INSERT INTO audiobooks (asin, author, title, status, series, narrator, "
-                        "runtime_min, release_date, publisher, language, purchase_date, summary, date_added) "
-                        "VALUES (?, ?, ?, 'NEW', ?, ?, ?, ?, ?, ?, ?, ?, ?)"
-                    ),
-                    # Ruff E501: Break long tuple of arguments into multiple lines
-                    (
-                        asin, author, title, series, narrator, runtime_min, release_date, publisher,
-                        language, purchase_date, summary, date_added
-                    ),
+                    "INSERT OR IGNORE INTO scanned_files (filepath) "
+                    "SELECT filepath FROM file_scan_cache WHERE filepath LIKE ? ESCAPE '\\'",
+                    (like_path_prefix(root),),
                 )
-            else:
-                updated_in_db += 1
+            cur.execute("DELETE FROM file_scan_cache WHERE filepath NOT IN (SELECT filepath FROM scanned_files)")
+            vanished = cur.rowcount
+        else:
+            vanished = 0
+            for scope in online_scopes:
+                cur.execute(
+                    "DELETE FROM file_scan_cache WHERE filepath LIKE ? ESCAPE '\\' "
+                    "AND filepath NOT IN (SELECT filepath FROM scanned_files)",
+                    (like_path_prefix(scope),),
+                )
+                vanished += cur.rowcount
+        cur.execute("DROP TABLE scanned_files")
+
+        # Same for the directories: store the re-listed ones and forget the ones that are gone.
+        cur.executemany(
+            "INSERT INTO dir_scan_cache (dirpath, mtime_ns, subdirs) VALUES (?, ?, ?) "
+            "ON CONFLICT(dirpath) DO UPDATE SET mtime_ns = excluded.mtime_ns, subdirs = excluded.subdirs",
+            list(dir_updates.values()),
+        )
+        cur.execute("CREATE TEMP TABLE scanned_dirs (dirpath TEXT PRIMARY KEY)")
+        cur.executemany("INSERT OR IGNORE INTO scanned_dirs (dirpath) VALUES (?)", [(d,) for d in visited_dirs])
+        if scan_dirs is None:
+            for root in offline_roots:
+                cur.execute(
+                    "INSERT OR IGNORE INTO scanned_dirs (dirpath) "
+                    "SELECT dirpath FROM dir_scan_cache WHERE dirpath = ? OR dirpath LIKE ? ESCAPE '\\'",
+                    (root, like_path_prefix(root)),
+                )
+            cur.execute("DELETE FROM dir_scan_cache WHERE dirpath NOT IN (SELECT dirpath FROM scanned_dirs)")
+        else:
+            for scope in online_scopes:
                 cur.execute(
-                    (
-                        "UPDATE audiobooks SET author = ?, title = ?, series = ?, narrator = ?, runtime_min = ?, "
-                        "release_date = ?, publisher = ?, language = ?, purchase_date = ?, date_added = ?, "
-                        "summary = CASE WHEN is_summary_full = 1 THEN summary ELSE ? END "
-                        "WHERE asin = ?"
-                    ),
-                    # Ruff E501: Break long tuple of arguments into multiple lines
-                    (
-                        author, title, series, narrator, runtime_min, release_date, publisher,
-                        language, purchase_date, date_added, summary, asin
-                    ),
+                    "DELETE FROM dir_scan_cache WHERE (dirpath = ? OR dirpath LIKE ? ESCAPE '\\') "
+                    "AND dirpath NOT IN (SELECT dirpath FROM scanned_dirs)",
+                    (scope, like_path_prefix(scope)),
                 )
+        cur.execute("DROP TABLE scanned_dirs")
         con.commit()
-        log.info(f"SYNC-LOGIC ({job_id}): Found {new_from_audible} new. Updated {updated_in_db} existing.")
 
-    return total_books
+    if os.path.exists(LEGACY_SCAN_CACHE_FILE):
+        try:
+            os.remove(LEGACY_SCAN_CACHE_FILE)
+            log.info(f"SYNC-LOGIC ({job_id}): Removed the legacy scan cache file {LEGACY_SCAN_CACHE_FILE}.")
+        except OSError as e:
+            log.warning(f"SYNC-LOGIC ({job_id}): Could not remove legacy scan cache file: {e}")
 
+    log.info(
+        f"SYNC-LOGIC ({job_id}): Scan complete. Processed {files_processed} files ({cache_hits} from cache, "
+        f"{files_moved} moved). Re-listed {len(dir_updates)} of {len(visited_dirs)} directories. "
+        f"Cache updated: {len(cache_updates)} written, {vanished} removed."
+    )
 
-# --- Private Helper 2: Scan the local filesystem for .m4b files ---
-def _scan_local_filesystem(job_id):
+    return found_files
+
+
+def _scan_known_files(job_id, asins):
     """
-    Generator that scans the /data directory for .m4b files, using a cache
-    to speed up the process. Yields progress updates and returns a dictionary
-    mapping ASINs to file paths.
+    Generator that re-checks only the files the database knows for a set of ASINs:
+    each book's filepath and every file_scan_cache row tagged with one of the ASINs.
+    Changed files are probed again and vanished ones are dropped from the cache, so
+    a single book is refreshed without walking the library. Files outside the
+    library roots or on a root that is not mounted are left to the reconciliation.
+    Yields progress updates and returns a dictionary mapping ASINs to file paths.
     """
-    yield from _yield_progress("Scanning local files...", 50, stage_text="Phase 2/3: Scanning Filesystem")
-    CONFIG_DIR = "/config"
-    AUDIOBOOK_LIBRARY_PATH = "/data"
-    CACHE_FILE = os.path.join(CONFIG_DIR, ".file_scan_cache")
-    cache = {}
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, encoding="utf-8") as f:
-            for line in f:
-                parts = line.strip().split("|", 2)
-                if len(parts) == 3:
-                    cache[parts[2]] = {"mtime": parts[0], "asin": parts[1]}
+    stage_text = "Phase 2/3: Checking Files"
+    yield from _yield_progress(f"Checking the files of {len(asins)} book(s)...", 50, stage_text=stage_text)
 
-    found_files = {}
-    new_cache_lines = []
-    files_processed, cache_hits = 0, 0
-
-    # Ruff E501: Rewrite long list comprehension as a standard loop for readability
-    files_to_scan = []
-    for r, _, fs in os.walk(AUDIOBOOK_LIBRARY_PATH):
-        for f in fs:
-            if f.endswith(".m4b"):
-                files_to_scan.append(os.path.join(r, f))
-
-    total_files_to_scan = len(files_to_scan)
-
-    for filepath in files_to_scan:
-        files_processed += 1
-        if total_files_to_scan > 0:
-            # This is phase 2/3, so progress goes from 50% to 95%
-            progress = 50 + int((files_processed / total_files_to_scan) * 45)
-            if files_processed % 5 == 0 or files_processed == total_files_to_scan:
-                status_text = f"Scanning local files... ({files_processed}/{total_files_to_scan})"
-                yield from _yield_progress(status_text, progress, stage_text="Phase 2/3: Scanning Filesystem")
-        try:
-            current_mtime = str(int(os.path.getmtime(filepath)))
-            if filepath in cache and cache[filepath]["mtime"] == current_mtime:
-                asin = cache[filepath]["asin"]
-                cache_hits += 1
+    roots = get_library_roots()
+    found_files, cache_updates, vanished = {}, [], []
+    with get_db_connection() as con:
+        cur = con.cursor()
+        cur.execute("CREATE TEMP TABLE target_asins (asin TEXT PRIMARY KEY)")
+        cur.executemany("INSERT OR IGNORE INTO target_asins (asin) VALUES (?)", [(asin,) for asin in asins])
+        rows = cur.execute(
+            """
+            SELECT filepath FROM audiobooks WHERE asin IN (SELECT asin FROM target_asins) AND filepath != ''
+            UNION
+            SELECT filepath FROM file_scan_cache WHERE asin IN (SELECT asin FROM target_asins)
+            """
+        ).fetchall()
+        cur.execute("DROP TABLE target_asins")
+
+        for filepath in (row["filepath"] for row in rows):
+            root = next((root for root in roots if is_path_under(filepath, root)), None)
+            if root is None or not os.path.isdir(root):
+                continue
+            try:
+                stat = os.stat(filepath)
+            except FileNotFoundError:
+                vanished.append((filepath,))
+                continue
+            except OSError as e:
+                log.warning(f"SYNC-LOGIC ({job_id}): Could not stat '{filepath}': {e}")
+                continue
+            row, moved = _lookup_scan_cache(cur, filepath, stat, root)
+            if row is not None and not moved:
+                probe = dict(row)
             else:
-                # Ruff E501: Break long command list into multiple lines
-                ffprobe_cmd = [
-                    "ffprobe", "-v", "quiet", "-show_entries", "format_tags=asin",
-                    "-of", "default=noprint_wrappers=1:nokey=1", filepath
-                ]
-                result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, check=True)
-                asin = result.stdout.strip()
-            if asin:
-                found_files[asin] = filepath
-                new_cache_lines.append(f"{current_mtime}|{asin}|{filepath}\n")
-        except (OSError, subprocess.CalledProcessError) as e:
-            log.warning(f"SYNC-LOGIC ({job_id}): Could not process file '{filepath}': {e}")
+                try:
+                    probe = dict(row) if row is not None else probe_audiobook_file(filepath, stat.st_size)
+                except (OSError, subprocess.CalledProcessError, ValueError) as e:
+                    log.warning(f"SYNC-LOGIC ({job_id}): Could not process file '{filepath}': {e}")
+                    continue
+                cache_updates.append(scan_cache_row(filepath, stat, probe))
+            if probe["asin"]:
+                found_files[probe["asin"]] = filepath
 
-    with open(CACHE_FILE, "w", encoding="utf-8") as f:
-        f.writelines(new_cache_lines)
-    log.info(f"SYNC-LOGIC ({job_id}): Scan complete. Processed {files_processed} files ({cache_hits} from cache).")
+        upsert_scan_cache(cur, cache_updates)
+        cur.executemany("DELETE FROM file_scan_cache WHERE filepath = ?", vanished)
+        con.commit()
 
+    log.info(
+        f"SYNC-LOGIC ({job_id}): Checked {len(rows)} known file(s). Found {len(found_files)}, "
+        f"{len(cache_updates)} re-probed, {len(vanished)} vanished."
+    )
     return found_files
 
+
 # --- Private Helper 3: Reconcile DB with filesystem scan ---
 def _reconcile_database(job_id, found_files):
     """
     Generator that compares the DB state with the filesystem scan results.
     It marks books as MISSING if their file is gone, and marks them as
     DOWNLOADED if the file is found but the DB state is wrong.
+
+    The scan results are bulk-loaded into a temp table, so both fixes are
+    set-based UPDATEs. A book found at a new path is only relocated, never
+    also counted as missing. Only a DOWNLOADED book whose path is neither in the
+    scan results nor in file_scan_cache is checked on disk, e.g. a file
+    without an ASIN tag or one stored outside the library root.
     """
     yield from _yield_progress("Reconciling database...", 95, stage_text="Phase 3/3: Reconciling Database")
-    marked_missing, fixed_untracked = 0, 0
     with get_db_connection() as con:
         cur = con.cursor()
-        downloaded_books = cur.execute("SELECT asin, filepath FROM audiobooks WHERE status = 'DOWNLOADED'").fetchall()
-        for book in downloaded_books:
-            if not book["filepath"] or not os.path.exists(book["filepath"]):
-                cur.execute("UPDATE audiobooks SET status = 'MISSING', filepath = '' WHERE asin = ?", (book["asin"],))
-                marked_missing += 1
-
-        for asin_from_file, correct_filepath in found_files.items():
-            db_status_row = cur.execute("SELECT status FROM audiobooks WHERE asin = ?", (asin_from_file,)).fetchone()
-            if db_status_row and db_status_row["status"] != "DOWNLOADED":
-                cur.execute(
-                    "UPDATE audiobooks SET status = 'DOWNLOADED', filepath = ? WHERE asin = ?",
-                    (correct_filepath, asin_from_file),
+        cur.execute("CREATE TEMP TABLE found_files (asin TEXT PRIMARY KEY, filepath TEXT)")
+        cur.executemany("INSERT INTO found_files (asin, filepath) VALUES (?, ?)", found_files.items())
+        cur.execute("CREATE INDEX temp.idx_found_files_filepath ON found_files (filepath)")
+
+        candidates = cur.execute(
+            """
+            SELECT asin, filepath FROM audiobooks
+            WHERE status = 'DOWNLOADED' AND asin NOT IN (SELECT asin FROM found_files) AND (
+                filepath IS NULL OR filepath = '' OR (
+                    filepath NOT IN (SELECT filepath FROM found_files)
+                    AND filepath NOT IN (SELECT filepath FROM file_scan_cache)
                 )
-                fixed_untracked += 1
+            )
+            """
+        ).fetchall()
+        missing = [(row["asin"],) for row in candidates if not row["filepath"] or not os.path.exists(row["filepath"])]
+        cur.executemany("UPDATE audiobooks SET status = 'MISSING', filepath = '' WHERE asin = ?", missing)
+        marked_missing = len(missing)
+
+        cur.execute(
+            """
+            UPDATE audiobooks
+            SET status = 'DOWNLOADED',
+                filepath = (SELECT f.filepath FROM found_files f WHERE f.asin = audiobooks.asin)
+            WHERE asin IN (SELECT asin FROM found_files) AND (
+                status IS NOT 'DOWNLOADED'
+                OR filepath IS NOT (SELECT f.filepath FROM found_files f WHERE f.asin = audiobooks.asin)
+            )
+            """
+        )
+        fixed_untracked = cur.rowcount
+        cur.execute("DROP TABLE found_files")
         con.commit()
     # Ruff E501: Break long f-string into multiple lines
     log.info(
@@ -268,16 +1062,45 @@ def _reconcile_database(job_id, found_files):
     )
 
 
+def _run_targeted_sync(job_id, target):
+    """
+    Generator for a TARGETED sync: re-fetches the selected books, re-checks the known
+    files of every book it touched, re-scans the selected folder and reconciles.
+    """
+    log.info(
+        f"SYNC-LOGIC ({job_id}): Targeted sync of {len(target['asins'])} ASIN(s), "
+        f"purchase window {target['purchased_after']} - {target['purchased_before']}, "
+        f"folders {target['scan_dirs']}."
+    )
+    library_diff = {"added": [], "changed": [], "unchanged": []}
+    if target["asins"] or target["purchased_after"]:
+        library_diff = yield from _fetch_and_update_targeted(job_id, target)
+
+    found_files_map = {}
+    if target["scan_dirs"]:
+        found_files_map.update((yield from _scan_local_filesystem(job_id, scan_dirs=target["scan_dirs"])))
+    touched_asins = set(target["asins"]).union(*library_diff.values()) - set(found_files_map)
+    if touched_asins:
+        found_files_map.update((yield from _scan_known_files(job_id, sorted(touched_asins))))
+
+    yield from _reconcile_database(job_id, found_files_map)
+    yield from _yield_progress("Finishing up...", 100, stage_text="Phase 3/3: Reconciling Database")
+
+
 # --- Main Public Function ---
-def run_sync_logic(job_id, sync_mode="DEEP"):
+def run_sync_logic(job_id, sync_mode="DEEP", job_params=None):
     """
     A generator function that orchestrates the entire library sync process.
 
     Args:
         job_id (int): The ID of the current job for logging.
-        sync_mode (str): The type of sync to perform. Can be "DEEP" or "FAST".
+        sync_mode (str): The type of sync to perform. Can be "DEEP", "FAST" or "TARGETED".
                          "DEEP" includes a full filesystem scan.
-                         "FAST" only fetches updates from the Audible API.
+                         "FAST" only fetches updates from the Audible API, and only
+                         recent purchases when an incremental sync is possible.
+                         "TARGETED" only refreshes the books and folders selected
+                         in job_params (see parse_sync_target).
+        job_params (dict, optional): The job's parameters, used by a TARGETED sync.
 
     Yields:
         str: Real-time event and log lines from the helper generators.
@@ -286,24 +1109,41 @@ def run_sync_logic(job_id, sync_mode="DEEP"):
     try:
         yield from _yield_progress("Initializing...", 2)
 
-        # Pass the sync_mode to the helper.
-        yield from _fetch_and_update_from_audible(job_id, sync_mode)
+        if sync_mode == "TARGETED":
+            yield from _run_targeted_sync(job_id, parse_sync_target(job_params or {}))
+            return True
+
+        # A FAST sync only asks for recent purchases unless a full listing is due.
+        purchased_after = _get_incremental_start(job_id) if sync_mode == "FAST" else None
+        if purchased_after:
+            log.info(f"SYNC-LOGIC ({job_id}): Running incremental fetch for books purchased after {purchased_after}.")
 
-        # If this is just a FAST sync, our work is done.
+        # If this is just a FAST sync, the API fetch is all there is to do.
         if sync_mode == "FAST":
+            yield from _fetch_and_update_from_audible(job_id, sync_mode, purchased_after)
             log.info(f"SYNC-LOGIC ({job_id}): Fast sync complete. Skipping filesystem scan.")
             # The helper has already yielded the final progress for a fast sync, so we just return.
             return True
 
-        # For a DEEP sync, continue with the filesystem-intensive phases.
-        found_files_map = yield from _scan_local_filesystem(job_id)
+        # For a DEEP sync, the network-bound fetch and the disk-bound scan are independent
+        # until reconciliation, so they run at the same time.
+        results = yield from _run_phases_concurrently(
+            job_id,
+            [
+                ("fetch", _fetch_and_update_from_audible(job_id, sync_mode, purchased_after), 5, 45),
+                ("scan", _scan_local_filesystem(job_id), 50, 95),
+            ],
+            progress_start=5,
+            progress_end=95,
+        )
+        found_files_map = results["scan"]
 
         yield from _reconcile_database(job_id, found_files_map)
 
         yield from _yield_progress("Finishing up...", 100, stage_text="Phase 3/3: Reconciling Database")
         return True
 
-    except (RuntimeError, sqlite3.Error) as e:
+    except (RuntimeError, ValueError, sqlite3.Error) as e:
         log.error(f"SYNC-LOGIC ({job_id}): A critical error occurred during sync: {e}", exc_info=True)
         yield from _yield_progress(f"Error: {e}", 100)
         return False
@@ -3,12 +3,18 @@
 import time
 from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
-from queue import PriorityQueue
-from threading import Event, Thread
+from queue import Empty, PriorityQueue
+from threading import Event, Lock, Thread
 
 from .logger import log
 from .settings import load_settings
 
+# While tasks are held back for free cores, the dispatcher checks for freed cores this often.
+CORE_WAIT_POLL_SEC = 0.5
+# Tasks that fit may start ahead of a held multi-core task, but once it has waited this long
+# no task queued behind it takes cores any more, so it cannot be starved by a stream of small tasks.
+CORE_RESERVATION_AFTER_SEC = 30
+
 
 # Use an Enum for clear, readable priority levels, as planned.
 # Lower numbers are higher priority.
@@ -21,10 +27,12 @@ class TaskPriority(IntEnum):
 # A simple dataclass-like structure to hold task information.
 # The __lt__ method is essential for the PriorityQueue to compare tasks.
 class Task:
-    def __init__(self, priority: TaskPriority, job_id: int, func, *args, **kwargs):
+    def __init__(self, priority: TaskPriority, job_id: int, func, *args, cores: int = 1, **kwargs):
         self.priority = priority
         self.job_id = job_id  # Associate task with a parent job for tracking
         self.func = func
+        # How many of the processing cores the task keeps busy, e.g. a multi-threaded ffmpeg.
+        self.cores = cores
         self.args = args
         self.kwargs = kwargs
 
@@ -50,6 +58,11 @@ class TaskRunner:
         self._stop_event = Event()
         self._worker_thread = None
         self.max_workers = 1  # Default to 1, will be configured on start
+        # Cores reserved by running tasks. A task only starts once its cores are free.
+        self._cores_in_use = 0
+        self._cores_lock = Lock()
+        # (task, time it was taken from the queue) for tasks waiting for enough free cores.
+        self._held_tasks = []
 
     def start(self):
         """Starts the main worker thread and initializes the ThreadPoolExecutor."""
@@ -114,22 +127,47 @@ class TaskRunner:
         """The main loop that pulls tasks from the queue and submits them to the thread pool."""
         while not self._stop_event.is_set():
             try:
-                # The `get()` call will block until an item is available.
-                task = self.queue.get()
-
-                if task is None:  # Sentinel value to exit
-                    continue
+                # Block until a task is available, or only briefly while held tasks wait for cores.
+                try:
+                    task = self.queue.get(timeout=CORE_WAIT_POLL_SEC if self._held_tasks else None)
+                except Empty:
+                    task = None
 
-                # Submit the task's `run` method to the thread pool.
-                # The thread pool will handle scheduling it on a free worker thread.
-                self.executor.submit(self._run_and_log_task, task)
+                if task is not None:  # None is the sentinel value to exit, or the poll timed out
+                    self._held_tasks.append((task, time.monotonic()))
+                self._dispatch_held_tasks()
 
             except Exception as e:
                 log.error(f"TASK_RUNNER: An unexpected error occurred in the worker loop: {e}", exc_info=True)
                 # Avoid a tight loop on continuous errors
                 time.sleep(1)
 
-    def _run_and_log_task(self, task: Task):
+    def _dispatch_held_tasks(self):
+        """Submits every held task whose cores are free, highest priority first."""
+        now = time.monotonic()
+        self._held_tasks.sort(key=lambda entry: (entry[0].priority, entry[1]))
+        with self._cores_lock:
+            for entry in list(self._held_tasks):
+                if self._stop_event.is_set():
+                    return
+                task, held_since = entry
+                # A task never reserves more than the whole pool.
+                cores = max(1, min(task.cores, self.max_workers))
+                if self._cores_in_use + cores > self.max_workers:
+                    if now - held_since >= CORE_RESERVATION_AFTER_SEC:
+                        break
+                    continue
+                try:
+                    # Submit the task's `run` method to the thread pool.
+                    # The thread pool will handle scheduling it on a free worker thread.
+                    self.executor.submit(self._run_and_log_task, task, cores)
+                except RuntimeError:
+                    # The pool is being replaced by reconfigure(); try again on the next poll.
+                    return
+                self._cores_in_use += cores
+                self._held_tasks.remove(entry)
+
+    def _run_and_log_task(self, task: Task, cores: int):
         """Wrapper to execute a task and handle logging and task completion."""
         try:
             log.info(f"TASK_RUNNER: Worker picked up task for Job {task.job_id} (Priority: {task.priority.name})")
@@ -137,6 +175,8 @@ class TaskRunner:
         except Exception as e:
             log.error(f"TASK_RUNNER: Task for Job {task.job_id} failed with an exception: {e}", exc_info=True)
         finally:
+            with self._cores_lock:
+                self._cores_in_use -= cores
             # This is crucial for the PriorityQueue to know the task is done.
             self.queue.task_done()
             log.info(f"TASK_RUNNER: Worker finished task for Job {task.job_id} (Priority: {task.priority.name})")
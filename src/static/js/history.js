@@ -178,7 +178,7 @@ async function fetchAndRenderHistory() {
                     .map(
                         (item) => `
                     <li class="history-book-list-item">
-                        <img class="history-book-thumb" src="/covers/${item.asin}_thumb.jpg" alt="Cover for ${item.asin}">
+                        <img class="history-book-thumb" src="/covers/${item.asin}?w=80&fmt=webp" alt="Cover for ${item.asin}">
                         <div class="history-book-info">
                             <strong>${item.status}:</strong> ${item.title}
                         </div>
@@ -16,6 +16,7 @@ const clearReportBtn = document.getElementById("clear-report-btn");
 const authWarningBanner = document.getElementById("auth-warning-banner");
 
 let libraryData = [];
+let coverAtlas = null; // Sprite sheet layout for the library grid covers
 let jobEventSource = null; // New eventSource for background jobs
 let currentJobId = null;
 let isBusy = false;
@@ -714,7 +715,7 @@ async function openDownloadSelectionModal() {
             // --- START: CORRECTED HTML STRUCTURE ---
             // The checkbox is now placed correctly, and the label wraps the clickable content.
             div.innerHTML = `
-                <img class="selection-book-thumb lazy-load" src="data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7" data-src="/covers/${book.asin}_thumb.jpg" alt="Cover">
+                <img class="selection-book-thumb lazy-load" src="data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7" data-src="/covers/${book.asin}?w=80&fmt=webp" alt="Cover">
                 <input type="checkbox" id="asin-${book.asin}" value="${book.asin}">
                 <label for="asin-${book.asin}" class="selection-book-info">
                     <span class="title">${book.title}</span>
@@ -789,7 +790,12 @@ const lazyLoadObserver = new IntersectionObserver((entries, observer) => {
     entries.forEach((entry) => {
         if (entry.isIntersecting) {
             const img = entry.target;
-            img.src = img.dataset.src;
+            if (img.dataset.bg) {
+                // Atlas covers are a background on a shared sprite sheet
+                img.style.backgroundImage = `url("${img.dataset.bg}")`;
+            } else {
+                img.src = img.dataset.src;
+            }
             img.classList.remove("lazy-load");
             observer.unobserve(img);
         }
@@ -833,7 +839,7 @@ function updateLibraryTable(books) {
                 ? `<button class="retry-button" data-asin="${book.asin}">Retry</button>`
                 : "";
         card.innerHTML = `
-        <img class="book-card-cover lazy-load" src="data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7" data-src="${book.cover_url || ""}" alt="Cover for ${book.title}">
+        ${renderBookCardCover(book)}
         <div class="book-card-info">
             <p class="book-card-title">${book.title}</p>
             <p class="book-card-author">${book.author}</p>
@@ -845,12 +851,28 @@ function updateLibraryTable(books) {
     initializeLazyLoading();
 }
 
+// Uses the book's slot in the cover atlas if it has one, otherwise its own cover image
+function renderBookCardCover(book) {
+    const position = coverAtlas && coverAtlas.covers[book.asin];
+    if (!position) {
+        return `<img class="book-card-cover lazy-load" src="data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7" data-src="${book.cover_url || ""}" alt="Cover for ${book.title}">`;
+    }
+    const [sheetNumber, column, row] = position;
+    const sheet = coverAtlas.sheets[sheetNumber];
+    const columns = coverAtlas.columns;
+    const x = columns > 1 ? (column / (columns - 1)) * 100 : 0;
+    const y = sheet.rows > 1 ? (row / (sheet.rows - 1)) * 100 : 0;
+    const style = `background-size: ${columns * 100}% ${sheet.rows * 100}%; background-position: ${x}% ${y}%;`;
+    return `<div class="book-card-cover atlas-cover lazy-load" role="img" aria-label="Cover for ${book.title}" data-bg="${sheet.url}" style="${style}"></div>`;
+}
+
 // --- Data Fetching ---
 async function fetchUpdates() {
     try {
         const response = await fetch("/get_page_data");
         const data = await response.json();
         libraryData = data.books;
+        coverAtlas = data.atlas || null;
         updateStats(data.stats);
         renderLibraryGrid();
     } catch (error) {
@@ -384,7 +384,12 @@ document.addEventListener("DOMContentLoaded", () => {
                         ? input.checked
                         : input.type === "number"
                           ? Number(input.value)
-                          : input.value;
+                          : input.dataset.type === "list"
+                            ? input.value
+                                  .split(/[\n,]/)
+                                  .map((item) => item.trim())
+                                  .filter(Boolean)
+                            : input.value;
                 current[path[path.length - 1]] = value;
             });
 